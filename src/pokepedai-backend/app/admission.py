@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+from .metrics import metrics
+
+logger = logging.getLogger("pokepedia.admission")
+
+MAX_CONCURRENT_PIPELINES = int(os.getenv("MAX_CONCURRENT_PIPELINES", "4"))
+MAX_QUEUED_PIPELINES = int(os.getenv("MAX_QUEUED_PIPELINES", "16"))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("QUEUE_TIMEOUT_SECONDS", "20"))
+# degrade to fewer RCR loops once this many requests are waiting, 0 disables degradation
+DEGRADE_QUEUE_DEPTH = int(os.getenv("DEGRADE_QUEUE_DEPTH", "4"))
+DEGRADED_MAX_LOOPS = int(os.getenv("DEGRADED_MAX_LOOPS", "1"))
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_concurrent=MAX_CONCURRENT_PIPELINES,
+        max_queue=MAX_QUEUED_PIPELINES,
+        queue_timeout=QUEUE_TIMEOUT_SECONDS,
+        degrade_queue_depth=DEGRADE_QUEUE_DEPTH,
+        degraded_max_loops=DEGRADED_MAX_LOOPS,
+    ):
+        """
+        Bound in-flight /chat pipelines. Up to max_concurrent run at once, up to max_queue wait
+        for a slot for at most queue_timeout seconds, anything beyond is rejected with 503.
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.degrade_queue_depth = degrade_queue_depth
+        self.degraded_max_loops = degraded_max_loops
+
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.in_flight = 0
+        self.queued = 0
+
+    def _retry_after(self):
+        """
+        Rough seconds until a slot frees up, based on recent pipeline latency.
+        """
+        p50 = metrics.percentile("admission.run_seconds", 50) or self.queue_timeout
+        waves = self.queued // max(self.max_concurrent, 1) + 1
+        return max(1, int(p50 * waves))
+
+    def _reject(self, reason):
+        metrics.incr(f"admission.rejected.{reason}")
+        retry_after = self._retry_after()
+        logger.warning(
+            "Shedding /chat request (%s): in_flight=%d queued=%d retry_after=%ds",
+            reason,
+            self.in_flight,
+            self.queued,
+            retry_after,
+        )
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please try again shortly.",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    def _update_gauges(self):
+        metrics.set_gauge("admission.in_flight", self.in_flight)
+        metrics.set_gauge("admission.queue_depth", self.queued)
+
+    def max_loops(self, requested):
+        """
+        RCR loop cap for a request admitted now, lowered while the queue is under pressure.
+        """
+        if self.degrade_queue_depth and self.queued >= self.degrade_queue_depth:
+            metrics.incr("admission.degraded")
+            return min(requested, self.degraded_max_loops)
+        return requested
+
+    @asynccontextmanager
+    async def admit(self, deadline=None):
+        """
+        Wait for a pipeline slot, fail fast with 503 when the queue is full or the wait times out.
+        The wait never outlasts the request's deadline.
+        """
+        # decided from our own counters before the first await: the semaphore only looks locked
+        # once earlier acquire() calls have run, so a burst in one event-loop tick would all queue
+        if self.in_flight + self.queued >= self.max_concurrent + self.max_queue:
+            self._reject("queue_full")
+
+        self.queued += 1
+        self._update_gauges()
+        wait_start = time.monotonic()
+        timeout = deadline.cap_timeout(self.queue_timeout) if deadline else self.queue_timeout
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self._reject("queue_timeout")
+        finally:
+            self.queued -= 1
+            metrics.observe("admission.wait_seconds", time.monotonic() - wait_start)
+            self._update_gauges()
+
+        self.in_flight += 1
+        self._update_gauges()
+        run_start = time.monotonic()
+        try:
+            yield self
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+            metrics.observe("admission.run_seconds", time.monotonic() - run_start)
+            self._update_gauges()
+
+
+admission_controller = AdmissionController()
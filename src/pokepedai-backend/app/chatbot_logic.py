@@ -1,9 +1,18 @@
-import json
-import faiss
+import contextvars
 import os
 import logging
+import threading
+import time
+from typing import Optional
+
+from .thread_budget import apply_thread_env
+
+# thread env vars must be set before torch / faiss are imported
+apply_thread_env()
+
+import faiss
+import numpy as np
 from sentence_transformers import SentenceTransformer
-from openai import OpenAI
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -11,14 +20,31 @@ from .chatbot_utils.utils import (
     trim_history,
     format_history,
     build_context,
+    format_chunk,
     extract_search_query,
+    extract_search_queries,
+    merge_results,
+    merge_with_quotas,
 )
+from .chatbot_utils.entities import extract_search_filters
+from .chatbot_utils.mmr import mmr_select
 from .chatbot_utils.prompt_provider import (
     make_rewrite_with_history_prompt,
     make_sufficiency_prompt,
     make_refinement_prompt,
     make_answer_prompt,
+    make_decomposition_prompt,
 )
+from .deadline import DeadlineExceeded, estimate_stage_seconds
+from .index_store import load_index_store, read_publish_manifest
+from .llm_client import DEFAULT_MODEL, LLMClient
+from .metrics import metrics
+from .profiles import resolve_profile
+from .query_log import query_log
+from .request_trace import stage_timer, trace_stage, traced_thread
+from .retrieval_cache import WARM_SNAPSHOT_PATH, normalize_query, retrieval_cache
+from .speculation import SpeculativeAnswer
+from .thread_budget import apply_runtime_threads, make_search_executor
 
 logger = logging.getLogger(__name__)
 
@@ -31,52 +57,172 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
     raise RuntimeError("OPENAI_API_KEY is not set. Check your .env or environment.")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+llm = LLMClient(api_key=OPENAI_API_KEY)
 
 # resolve paths for data files
 BASE_DIR = Path(__file__).resolve().parent
 
 DATA_DIR = BASE_DIR / "data"
-INDEX_PATH = DATA_DIR / "pokemon_faiss.index"
-META_PATH = DATA_DIR / "pokemon_metadata.json"
-
-# load FAISS
-logger.info("Loading FAISS index from %s", INDEX_PATH)
-index = faiss.read_index(str(INDEX_PATH))
-with open(META_PATH, "r", encoding="utf-8") as f:
-    corpus_meta = json.load(f)
-
-logger.info(
-    "Loaded %d chunks from metadata; FAISS index has %d vectors.",
-    len(corpus_meta),
-    index.ntotal,
-)
+INDEX_PATH = Path(os.getenv("INDEX_PATH", DATA_DIR / "pokemon_faiss.index"))
+META_PATH = Path(os.getenv("META_PATH", DATA_DIR / "pokemon_metadata.json"))
+EMBED_MODEL_NAME = os.getenv("EMBED_MODEL_NAME", "all-MiniLM-L6-v2")
+
+# load FAISS, searches read `index_store` once so a reload swaps index and metadata together
+index_store = load_index_store(INDEX_PATH, META_PATH)
+_reload_lock = threading.Lock()
 
 # embedding model used for indexing
-embed_model = SentenceTransformer("all-MiniLM-L6-v2")
-logger.info("Loaded sentence-transformer model all-MiniLM-L6-v2")
+embed_model = SentenceTransformer(EMBED_MODEL_NAME)
+logger.info("Loaded sentence-transformer model %s", EMBED_MODEL_NAME)
+
+apply_runtime_threads()
+search_executor = make_search_executor()
 
 
-def dense_search(query, top_k: int = 50, debug: bool = False):
+def reload_index(index_path=INDEX_PATH, meta_path=META_PATH):
     """
-    Return top k document matches with RAG retrieval.
+    Load a freshly built index and atomically swap it in, in-flight searches finish on the old one.
     """
-    logger.info("[STEP] dense_search | query='%s'", query)
+    global index_store
 
-    try:
-        q_vec = embed_model.encode([query], convert_to_tensor=False).astype("float32")
-        D, I = index.search(q_vec, top_k)
-    except Exception:
-        logger.exception("Error during dense_search (embedding or FAISS search)")
-        raise
+    with _reload_lock:
+        new_store = load_index_store(index_path, meta_path)
+        old_version = index_store.version
+        index_store = new_store
 
-    D, I = D[0], I[0]
+    logger.info(
+        "Swapped FAISS index %s -> %s (%d vectors)",
+        old_version,
+        new_store.version,
+        new_store.index.ntotal,
+    )
+    metrics.incr("index.reloads")
+
+    # the cache drops entries for the old index, pick up a snapshot built for the new one
+    warm_caches()
+    return new_store
+
+
+def reload_if_published(index_path=INDEX_PATH, meta_path=META_PATH):
+    """
+    Reload when the publish manifest names another build than the one being served.
+    Each worker polls this: /admin/reload-index only swaps the worker that handled it.
+    Returns the new store, None when there is nothing new (or a reload is already running).
+    """
+    manifest = read_publish_manifest(index_path)
+    if manifest is None or manifest.get("index") == index_store.version:
+        return None
+    if _reload_lock.locked():
+        return None
+
+    logger.info(
+        "Publish manifest names index %s, serving %s, reloading",
+        manifest.get("index"),
+        index_store.version,
+    )
+    return reload_index(index_path, meta_path)
+
+
+def warm_caches(snapshot_path=WARM_SNAPSHOT_PATH):
+    """
+    Load the precomputed popular-query snapshot for the current index, if there is one.
+    """
+    return retrieval_cache.load_snapshot(snapshot_path, index_store.version)
 
+
+def infer_search_filters(query, store=None):
+    """
+    Pokémon / section filters for a query, from the names and sections in `store`
+    (default: the loaded index).
+    """
+    store = store or index_store
+    return extract_search_filters(
+        query, store.pokemon_names, store.section_postings.keys()
+    )
+
+
+def filtered_search(store, q_vec, top_k, ids):
+    """
+    FAISS search restricted to `ids` through an ID selector.
+    """
+    selector = faiss.IDSelectorBatch(ids)
+    params = faiss.SearchParameters(sel=selector)
+    return store.index.search(q_vec, min(top_k, len(ids)), params=params)
+
+
+def encode_queries(queries):
+    """
+    Embeddings for several queries as one matrix. Cached vectors are reused and all
+    misses are embedded in a single encode call.
+    """
+    keys = [normalize_query(q) for q in queries]
+    vectors = [retrieval_cache.vectors.get(key) for key in keys]
+
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        with stage_timer("embed"):
+            encoded = embed_model.encode(
+                [queries[i] for i in missing], convert_to_tensor=False
+            ).astype("float32")
+        for row, i in enumerate(missing):
+            vectors[i] = encoded[row : row + 1]
+            retrieval_cache.vectors.put(keys[i], vectors[i])
+
+    return np.vstack(vectors)
+
+
+def encode_query(query):
+    """
+    Query embedding, served from the vector cache when this query was seen before.
+    """
+    return encode_queries([query])
+
+
+def encode_and_search(store, query, top_k, ids=None):
+    """
+    Embed the query and run the FAISS search, runs on the bounded search executor.
+    """
+    with traced_thread():
+        q_vec = encode_query(query)
+        with stage_timer("faiss"):
+            if ids is None or not len(ids):
+                return store.index.search(q_vec, top_k)
+
+            D, I = filtered_search(store, q_vec, top_k, ids)
+            metrics.incr("dense_search.filtered")
+            if len(ids) < top_k:
+                D_all, I_all = store.index.search(q_vec, top_k)
+                D = np.concatenate([D, D_all], axis=1)
+                I = np.concatenate([I, I_all], axis=1)
+            return D, I
+
+
+def encode_and_search_batch(store, queries, top_k):
+    """
+    Embed all queries in one call and search them as one FAISS query matrix.
+    """
+    with traced_thread():
+        q_vecs = encode_queries(queries)
+        with stage_timer("faiss"):
+            return store.index.search(q_vecs, top_k)
+
+
+def hits_to_results(store, D, I, top_k, debug: bool = False):
+    """
+    Turn one row of FAISS distances / ids into result dicts, skipping padding and duplicates.
+    """
     results = []
+    seen = set()
     for rank, (dist, idx) in enumerate(zip(D, I), start=1):
         idx = int(idx)
+        # FAISS pads with -1 when fewer than top_k vectors match
+        if idx < 0 or idx in seen:
+            continue
+        if len(results) >= top_k:
+            break
+        seen.add(idx)
         score = -float(dist)
-        doc = corpus_meta[idx]
+        doc = store.corpus_meta[idx]
         results.append(
             {
                 "idx": idx,
@@ -103,9 +249,162 @@ def dense_search(query, top_k: int = 50, debug: bool = False):
     return results
 
 
-def rewrite_query_with_history(query, history, debug: bool = False):
+def dense_search(
+    query,
+    top_k: int = 50,
+    debug: bool = False,
+    deadline=None,
+    pokemon=None,
+    sections=None,
+    store=None,
+):
+    """
+    Return top k document matches with RAG retrieval.
+    `pokemon` / `sections` restrict the search to those chunks, backfilled from the whole
+    corpus if the filtered set has fewer than top_k matches.
+    `store` pins the IndexStore to search (default: the loaded one), callers that go on to read
+    the results' vectors pass the same store along.
+    """
+    logger.info(
+        "[STEP] dense_search | query='%s' pokemon=%s sections=%s",
+        query,
+        pokemon,
+        sections,
+    )
+
+    if deadline:
+        deadline.check("dense_search")
+
+    # the cache version is only moved by reloads, `store` may already be the old index
+    store = store or index_store
+    cache_key = retrieval_cache.hits_key(store.version, query, top_k, pokemon, sections)
+    cached = retrieval_cache.hits.get(cache_key)
+
+    if cached is not None:
+        D, I = cached
+    else:
+        ids = store.filter_ids(pokemon, sections)
+
+        start = time.monotonic()
+        try:
+            # the copied context carries the request trace onto the executor thread
+            D, I = search_executor.submit(
+                contextvars.copy_context().run,
+                encode_and_search,
+                store,
+                query,
+                top_k,
+                ids,
+            ).result()
+        except Exception:
+            logger.exception("Error during dense_search (embedding or FAISS search)")
+            raise
+        seconds = time.monotonic() - start
+        metrics.observe("dense_search.seconds", seconds)
+        trace_stage("dense_search", seconds)
+        retrieval_cache.hits.put(cache_key, (D, I))
+
+    return hits_to_results(store, D[0], I[0], top_k, debug)
+
+
+def chunk_vectors(store, ids):
+    """
+    Stored embeddings for the given FAISS ids, read back from the index.
+    """
+    ids = np.asarray(ids, dtype="int64")
+    try:
+        return store.index.reconstruct_batch(ids)
+    except (AttributeError, RuntimeError):
+        return np.vstack([store.index.reconstruct(int(i)) for i in ids])
+
+
+def diversify(store, results, query, max_chars, lambda_):
+    """
+    Reorder / prune results with MMR so the context budget holds relevant but non-redundant chunks.
+    `store` must be the IndexStore the results were retrieved from.
+    """
+    if len(results) < 2:
+        return results
+
+    try:
+        vectors = chunk_vectors(store, [r["idx"] for r in results])
+    except Exception:
+        # e.g. an index type that can't reconstruct vectors, keep rank order
+        logger.exception("MMR: could not read chunk vectors, keeping rank order")
+        return results
+
+    lengths = [len(format_chunk(r["doc"])) for r in results]
+    with stage_timer("mmr"):
+        order = mmr_select(encode_query(query)[0], vectors, lengths, max_chars, lambda_)
+    return [results[i] for i in order]
+
+
+def fetch_k_for(profile, k=None):
+    """
+    Candidates fetched per search: k, widened by the MMR fetch factor when the profile reranks.
+    RCR and the cache warm-up both use this so warmed hits match live searches.
+    """
+    k = k or profile.k
+    return k * profile.mmr_fetch_factor if profile.rerank else k
+
+
+def select_context_results(store, results, query, profile):
+    """
+    The results a context is built from, MMR diversified when the profile reranks.
+    """
+    if not profile.rerank:
+        return results
+    return diversify(store, results, query, profile.max_context_chars, profile.mmr_lambda)
+
+
+def dense_search_batch(
+    queries, top_k: int = 8, debug: bool = False, deadline=None, store=None
+):
+    """
+    Search several sub-queries with one embedding call and one FAISS search.
+    Returns one result list per query. Sub-queries are not filtered: FAISS applies
+    search parameters to the whole query matrix. `store` as for dense_search.
+    """
+    logger.info("[STEP] dense_search_batch | queries=%s", queries)
+
+    if deadline:
+        deadline.check("dense_search")
+
+    store = store or index_store
+
+    start = time.monotonic()
+    try:
+        D, I = search_executor.submit(
+            contextvars.copy_context().run,
+            encode_and_search_batch,
+            store,
+            queries,
+            top_k,
+        ).result()
+    except Exception:
+        logger.exception("Error during dense_search_batch (embedding or FAISS search)")
+        raise
+    seconds = time.monotonic() - start
+    metrics.observe("dense_search.seconds", seconds)
+    trace_stage("dense_search", seconds)
+
+    return [
+        hits_to_results(store, D[row], I[row], top_k, debug)
+        for row in range(len(queries))
+    ]
+
+
+def rewrite_query_with_history(
+    query,
+    history,
+    previous_query=None,
+    debug: bool = False,
+    deadline=None,
+    model: str = DEFAULT_MODEL,
+):
     """
     First chatbot, rewrites query with context to be input into RAG.
+    `previous_query` is the last turn's rewritten query when the conversation has a server side session.
     """
     logger.info("[STEP] rewrite_query_with_history | query='%s'", query)
 
@@ -115,14 +414,10 @@ def rewrite_query_with_history(query, history, debug: bool = False):
     history = trim_history(history)
     convo = format_history(history)
 
-    prompt = make_rewrite_with_history_prompt(convo, query)
+    prompt = make_rewrite_with_history_prompt(convo, query, previous_query)
 
     try:
-        response = client.responses.create(
-            model="gpt-4.1-mini",
-            input=prompt,
-        )
-        rewritten = (response.output_text or "").strip()
+        rewritten = llm.complete("rewrite", prompt, model=model, deadline=deadline)
         logger.info(
             "[STEP] rewrite_query_with_history_done | rewritten_query='%s'", rewritten
         )
@@ -133,6 +428,8 @@ def rewrite_query_with_history(query, history, debug: bool = False):
                 rewritten,
             )
         return rewritten
+    except DeadlineExceeded:
+        raise
     except Exception:
         logger.exception(
             "Error while rewriting query; falling back to original query"
@@ -140,7 +437,9 @@ def rewrite_query_with_history(query, history, debug: bool = False):
         return query
 
 
-def sufficiency(query, context, debug: bool = False):
+def sufficiency(
+    query, context, debug: bool = False, deadline=None, model: str = DEFAULT_MODEL
+):
     """
     Ask the model if the current context is sufficient to answer the query.
     """
@@ -150,11 +449,11 @@ def sufficiency(query, context, debug: bool = False):
     suff_text = ""
 
     try:
-        suff_resp = client.responses.create(
-            model="gpt-4.1-mini",
-            input=suff_prompt,
+        suff_text = llm.complete(
+            "sufficiency", suff_prompt, model=model, deadline=deadline
         )
-        suff_text = (suff_resp.output_text or "").strip()
+    except DeadlineExceeded:
+        raise
     except Exception:
         logger.exception("RCR: sufficiency check failed")
         # If sufficiency check fails, treat as not sufficient so we keep looping.
@@ -174,7 +473,9 @@ def sufficiency(query, context, debug: bool = False):
     return False
 
 
-def refinement(context, current_query, debug: bool = False):
+def refinement(
+    context, current_query, debug: bool = False, deadline=None, model: str = DEFAULT_MODEL
+):
     """
     Ask the model how to refine the search query given the current context.
     """
@@ -183,11 +484,9 @@ def refinement(context, current_query, debug: bool = False):
     refine_prompt = make_refinement_prompt(context, current_query)
 
     try:
-        refine_resp = client.responses.create(
-            model="gpt-4.1-mini",
-            input=refine_prompt,
+        refine_text = llm.complete(
+            "refinement", refine_prompt, model=model, deadline=deadline
         )
-        refine_text = (refine_resp.output_text or "").strip()
 
         if debug:
             logger.debug(
@@ -197,12 +496,51 @@ def refinement(context, current_query, debug: bool = False):
             )
 
         return refine_text
+    except DeadlineExceeded:
+        raise
     except Exception:
         logger.exception("RCR: refinement step failed")
         return None
 
 
-def answer(context, query, debug: bool = False):
+def decompose_query(
+    query,
+    max_subqueries: int = 4,
+    debug: bool = False,
+    deadline=None,
+    model: str = DEFAULT_MODEL,
+):
+    """
+    Ask the planner to split a multi-part question into standalone sub-queries.
+    Falls back to the query itself.
+    """
+    logger.info("[STEP] decompose | query='%s'", query)
+
+    prompt = make_decomposition_prompt(query, max_subqueries)
+
+    try:
+        plan_text = llm.complete("decompose", prompt, model=model, deadline=deadline)
+    except DeadlineExceeded:
+        raise
+    except Exception:
+        logger.exception("RCR: decomposition failed, searching the query as is")
+        return [query]
+
+    subqueries = extract_search_queries(plan_text, max_subqueries) or [query]
+
+    if debug:
+        logger.debug(
+            "[DEBUG] decompose | query='%s' subqueries=%s",
+            query,
+            subqueries,
+        )
+
+    return subqueries
+
+
+def answer(
+    context, query, debug: bool = False, deadline=None, model: str = DEFAULT_MODEL
+):
     """
     Final answer generation using the retrieved context.
     """
@@ -214,13 +552,11 @@ def answer(context, query, debug: bool = False):
     prompt = make_answer_prompt(context, query)
 
     try:
-        response = client.responses.create(
-            model="gpt-4.1-mini",
-            input=prompt,
-        )
-        reply = response.output_text
+        reply = llm.complete("answer", prompt, model=model, deadline=deadline)
         logger.info("[STEP] answer_generation_done | query='%s'", query)
         return reply
+    except DeadlineExceeded:
+        raise
     except Exception:
         logger.exception("OpenAI generation failed")
         return (
@@ -229,31 +565,115 @@ def answer(context, query, debug: bool = False):
         )
 
 
+def can_afford_another_loop(deadline):
+    """
+    True if the remaining budget covers a refinement, another search + sufficiency loop and the answer.
+    """
+    if deadline is None:
+        return True
+
+    needed = (
+        estimate_stage_seconds("llm.refinement")
+        + estimate_stage_seconds("dense_search")
+        + estimate_stage_seconds("llm.sufficiency")
+        + estimate_stage_seconds("llm.answer")
+    )
+    return deadline.can_afford(needed)
+
+
 def recursive_dense_retrieval(
     query: str,
-    max_loops: int = 4,
-    k: int = 8,
+    max_loops: Optional[int] = None,
+    k: Optional[int] = None,
+    seed_results=None,
     debug: bool = False,
+    deadline=None,
+    profile=None,
+    on_loop=None,
+    speculation=None,
+    store=None,
 ):
+    """
+    Recursively search and refine the query until the context is sufficient.
+    `profile` supplies the loop cap, k, context budget, models and whether the sufficiency judge runs;
+    `max_loops` / `k` override it.
+    `seed_results` (the previous turn's retrieval pool) is merged into the first loop so follow ups
+    start from prior context, they come back flagged `seeded` and must come from `store`.
+    Every loop searches `store` (default: the index loaded when the call starts).
+    With a `deadline`, no new loop starts unless the budget can still cover it and the answer call.
+    `on_loop(loop, query, results)` is called with each loop's context results.
+    With a `speculation` (SpeculativeAnswer), the answer for the loop-1 context is started alongside
+    the sufficiency check and cancelled once refinement produces a new query for another loop.
+    Returns the final query and the results its context was built from.
+    """
     logger.info("[STEP] RCR_start | initial_query='%s'", query)
 
+    profile = profile or resolve_profile()
+    max_loops = max_loops or profile.max_loops
+    k = k or profile.k
+    fetch_k = fetch_k_for(profile, k)
+    # one store for the whole call, a reload mid-request must not mix ids from two indexes
+    store = store or index_store
+
     current_query = query
+    results_query = None
+    results = []
+    loops_run = 0
+    decomposed = False
 
     for loop in range(1, max_loops + 1):
+        loops_run = loop
         logger.info(
             "[STEP] RCR_loop | loop=%d | query='%s'",
             loop,
             current_query,
         )
 
+        subqueries = []
+        if loop == 1 and profile.decompose:
+            subqueries = decompose_query(
+                current_query,
+                profile.max_subqueries,
+                debug,
+                deadline,
+                model=profile.model_for("decompose"),
+            )
+
         # retrieve chunks
-        results = dense_search(
-            query=current_query,
-            top_k=k,
-            debug=debug,
-        )
+        if len(subqueries) > 1:
+            # every sub-query in one embed + search pass, merged with equal quotas
+            decomposed = True
+            metrics.incr("rcr.decomposed")
+            results = merge_with_quotas(
+                dense_search_batch(
+                    subqueries, top_k=fetch_k, debug=debug, deadline=deadline, store=store
+                ),
+                fetch_k,
+            )
+        else:
+            new_results = dense_search(
+                query=current_query,
+                top_k=fetch_k,
+                debug=debug,
+                deadline=deadline,
+                store=store,
+                **infer_search_filters(current_query, store),
+            )
+            # refinements of a decomposed question keep what the other sub-queries found
+            results = merge_results(new_results, results) if decomposed else new_results
+        results_query = current_query
+
+        if loop == 1 and seed_results:
+            # copies flagged as seeded, so the next turn's pool can leave them out
+            results = merge_results(
+                results, [dict(r, seeded=True) for r in seed_results]
+            )
 
-        context = build_context(results)
+        results = select_context_results(store, results, current_query, profile)
+
+        context = build_context(results, profile.max_context_chars)
+        if on_loop:
+            on_loop(loop, current_query, results)
 
         if debug:
             logger.debug(
@@ -262,7 +682,26 @@ def recursive_dense_retrieval(
                 context,
             )
 
-        sufficient = sufficiency(current_query, context, debug)
+        # without the judge there is nothing to decide another loop on
+        if not profile.sufficiency:
+            break
+
+        if speculation is not None and loop == 1:
+            speculation.start(
+                current_query,
+                context,
+                make_answer_prompt(context, current_query),
+                model=profile.model_for("answer"),
+                deadline=deadline,
+            )
+
+        sufficient = sufficiency(
+            current_query,
+            context,
+            debug,
+            deadline,
+            model=profile.model_for("sufficiency"),
+        )
         if sufficient:
             logger.info(
                 "[STEP] RCR_stop_sufficient | loop=%d | query='%s'",
@@ -271,7 +710,32 @@ def recursive_dense_retrieval(
             )
             break
 
-        refine_text = refinement(context, current_query, debug)
+        if not can_afford_another_loop(deadline):
+            metrics.incr("rcr.stopped_by_deadline")
+            logger.info(
+                "[STEP] RCR_stop_budget | loop=%d | query='%s'",
+                loop,
+                current_query,
+            )
+            break
+
+        refine_text = refinement(
+            context,
+            current_query,
+            debug,
+            deadline,
+            model=profile.model_for("refinement"),
+        )
+        # refinement failed (e.g. its breaker is open), answer from the context we have
+        if refine_text is None:
+            metrics.incr("rcr.stopped_by_refinement_error")
+            logger.info(
+                "[STEP] RCR_stop_refinement_failed | loop=%d | query='%s'",
+                loop,
+                current_query,
+            )
+            break
+
         new_query = extract_search_query(refine_text)
 
         if debug:
@@ -289,38 +753,114 @@ def recursive_dense_retrieval(
             )
             break
 
+        # another loop is coming, the speculative answer's context won't be the final one
+        if speculation is not None:
+            speculation.cancel()
+
         current_query = new_query
 
+    # loops ran out after a refinement, search the last refined query
+    if results_query != current_query:
+        new_results = dense_search(
+            query=current_query,
+            top_k=fetch_k,
+            debug=debug,
+            deadline=deadline,
+            store=store,
+            **infer_search_filters(current_query, store),
+        )
+        results = merge_results(new_results, results) if decomposed else new_results
+        results = select_context_results(store, results, current_query, profile)
+
+    metrics.observe(f"profile.{profile.name}.loops", loops_run)
     logger.info("[STEP] RCR_complete | final_query='%s'", current_query)
 
-    return current_query
+    return current_query, results
 
 
-def answer_with_rag(query, history=None, k: int = 8, debug: bool = False):
+def answer_with_rag(
+    query,
+    history=None,
+    k: Optional[int] = None,
+    max_loops: Optional[int] = None,
+    session=None,
+    debug: bool = False,
+    deadline=None,
+    profile=None,
+):
+    """
+    Full pipeline: rewrite, recursive retrieval and answer generation.
+    `profile` (default: the server's default profile) picks k, loops, context budget, models and
+    optional stages; `k` / `max_loops` override it.
+    When `session` is given, its cached rewrite and retrieval pool seed this turn and are updated after it.
+    `deadline` is checked by every stage and raises DeadlineExceeded once spent or cancelled.
+    """
     if history is None:
         history = []
 
-    logger.info("[STEP] answer_with_rag_start | query='%s'", query)
+    profile = profile or resolve_profile()
+    k = k or profile.k
+    max_loops = min(max_loops or profile.max_loops, profile.max_loops)
+
+    logger.info(
+        "[STEP] answer_with_rag_start | query='%s' profile=%s", query, profile.name
+    )
+    metrics.incr(f"profile.{profile.name}.requests")
+    start = time.monotonic()
+
+    # the whole turn reads one index, the session pool is only reused if it came from it too
+    store = index_store
+    previous_query, seed_results = None, None
+    if session:
+        _, previous_query, seed_results = session.snapshot(store.version)
 
     # Step 1: take context and rewrite query to be a self contained context
-    rag_query = rewrite_query_with_history(query=query, history=history, debug=debug)
+    if profile.rewrite:
+        rag_query = rewrite_query_with_history(
+            query=query,
+            history=history,
+            previous_query=previous_query,
+            debug=debug,
+            deadline=deadline,
+            model=profile.model_for("rewrite"),
+        )
+    else:
+        rag_query = query
+
+    query_log.record(rag_query)
+
+    # popular questions may have a precomputed answer for this profile
+    retrieval_cache.ensure_version(index_store.version)
+    cached = retrieval_cache.answers.get(
+        retrieval_cache.answer_key(rag_query, profile.name)
+    )
+    if cached is not None:
+        logger.info("[STEP] answer_with_rag_cached | query='%s'", rag_query)
+        metrics.incr(f"profile.{profile.name}.cached_answers")
+        if session:
+            session.record_turn(query, cached["answer"], rag_query, [])
+        return cached["answer"]
+
+    # the answer for the loop-1 context can stream while the judge runs
+    speculation = (
+        SpeculativeAnswer(llm) if profile.speculate and profile.sufficiency else None
+    )
 
     # Step 2: try recursive retrieval
     try:
-        final_query = recursive_dense_retrieval(
+        final_query, results = recursive_dense_retrieval(
             query=rag_query,
-            max_loops=4,
+            max_loops=max_loops,
             k=k,
+            seed_results=seed_results,
             debug=debug,
+            deadline=deadline,
+            profile=profile,
+            speculation=speculation,
+            store=store,
         )
 
-        results = dense_search(
-            query=final_query,
-            top_k=k,
-            debug=debug,
-        )
-
-        context = build_context(results)
+        context = build_context(results, profile.max_context_chars)
 
         if debug:
             logger.debug(
@@ -328,16 +868,36 @@ def answer_with_rag(query, history=None, k: int = 8, debug: bool = False):
                 final_query,
                 context,
             )
+    except DeadlineExceeded:
+        if speculation:
+            speculation.cancel()
+        raise
     except Exception:
+        if speculation:
+            speculation.cancel()
         logger.exception(
             "Retrieval (RCR) failed for query='%s' (rewritten='%s')",
             query,
             rag_query,
         )
+        metrics.incr(f"profile.{profile.name}.errors")
         return (
             "Sorry, I ran into a problem looking up the Pokémon data. "
             "Please try again in a moment."
         )
 
     logger.info("[STEP] answer_with_rag_answer | query='%s'", final_query)
-    return answer(context, final_query, debug)
+    reply = speculation.take(final_query, context) if speculation else None
+    if reply is None:
+        reply = answer(
+            context, final_query, debug, deadline, model=profile.model_for("answer")
+        )
+    metrics.observe(f"profile.{profile.name}.seconds", time.monotonic() - start)
+
+    if session:
+        # only keep this turn's own hits as the next pool: MMR can rank seeded chunks first,
+        # and they would otherwise carry forward turn after turn
+        fresh = [r for r in results if not r.get("seeded")]
+        session.record_turn(query, reply, rag_query, fresh[:k], store.version)
+
+    return reply
@@ -0,0 +1,148 @@
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# longest Pokémon name in tokens, with headroom (e.g. "Nidoran♀ (female)", "Iron Jugulis")
+MAX_NAME_TOKENS = 3
+
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9.'’:♀♂-]*")
+
+# question keywords -> sections they point at, only sections present in the index are used
+SECTION_KEYWORDS = {
+    "moves": (
+        r"\b(moves?|movesets?|learn(s|set|sets)?|level[- ]?up|tms?|hms?|tutor|egg moves?)\b",
+        ["moves", "moves-by-generation"],
+    ),
+    "locations": (
+        r"\b(where|locations?|catch|found|find|encounters?|routes?)\b",
+        ["locations"],
+    ),
+    "evolutions": (
+        r"\b(evolves?|evolutions?|evolving|evolved)\b",
+        ["evolutions"],
+    ),
+    "abilities": (
+        r"\b(abilit(y|ies)|hidden ability)\b",
+        ["abilities", "abilities_table"],
+    ),
+    "statistics": (
+        r"\b(stats?|base stats?|bst|statistics)\b",
+        ["statistics"],
+    ),
+    "training": (
+        r"\b(ev yield|catch rate|base exp(erience)?|growth rate|friendship)\b",
+        ["training", "effort-values"],
+    ),
+    "breeding": (
+        r"\b(egg groups?|breed(s|ing)?|hatch(es|ing)?|gender)\b",
+        [
+            "breeding",
+            "egg-groups",
+            "breeding-moves",
+            "breeding-abilities",
+            "breeding-exceptions",
+            "breeding-baby-pokemon",
+        ],
+    ),
+    # the chart is general, the Pokémon's own typing is in its core chunk
+    "matchups": (
+        r"\b(weak(ness|nesses)?|resist(s|ant|ances?)?|super effective|effective against|immune)\b",
+        ["type-matchups", "core"],
+    ),
+}
+SECTION_PATTERNS = {
+    group: (re.compile(pattern), sections)
+    for group, (pattern, sections) in SECTION_KEYWORDS.items()
+}
+
+
+def _normalize_token(token):
+    for suffix in ("'s", "’s"):
+        if token.endswith(suffix):
+            token = token[: -len(suffix)]
+    return token.rstrip(".,:;'’")
+
+
+def _name_key(text):
+    return " ".join(_normalize_token(t) for t in TOKEN_RE.findall(text.lower()))
+
+
+def name_keys(name):
+    """
+    Lookup keys for a display name, tokenized the same way as queries so punctuated names match
+    ("Mr. Mime" -> "mr mime", "Type: Null" -> "type null"). A parenthesized qualifier also gets
+    keys without it ("Nidoran♀ (female)" -> "nidoran♀", "nidoran female").
+    """
+    keys = {_name_key(name)}
+    match = re.match(r"^(.*?)\s*\(([^)]*)\)\s*$", name)
+    if match:
+        base, qualifier = match.groups()
+        keys.add(_name_key(base))
+        keys.add(_name_key(f"{base.strip('♀♂ ')} {qualifier}"))
+    return {key for key in keys if key}
+
+
+def build_name_index(names):
+    """
+    Lookup key -> display name for find_pokemon, keys shared by several names are dropped as ambiguous.
+    """
+    index = {}
+    ambiguous = set()
+    for name in names:
+        for key in name_keys(name):
+            if key in index and index[key] != name:
+                ambiguous.add(key)
+            index[key] = name
+    for key in ambiguous:
+        del index[key]
+    return index
+
+
+def find_pokemon(query, pokemon_names):
+    """
+    Return the Pokémon named in the query, `pokemon_names` is a build_name_index lookup.
+    """
+    tokens = [_normalize_token(t) for t in TOKEN_RE.findall(query.lower())]
+    found = set()
+    for n in range(MAX_NAME_TOKENS, 0, -1):
+        for i in range(len(tokens) - n + 1):
+            name = pokemon_names.get(" ".join(tokens[i : i + n]))
+            if name:
+                found.add(name)
+    return found
+
+
+def find_sections(query, section_names):
+    """
+    Return the sections the query asks about, restricted to sections that exist.
+    """
+    lowered = query.lower()
+    groups = []
+    for group, (pattern, sections) in SECTION_PATTERNS.items():
+        if pattern.search(lowered):
+            present = [s for s in sections if s in section_names]
+            if present:
+                groups.append(present)
+    return groups
+
+
+def extract_search_filters(query, pokemon_names, section_names):
+    """
+    Infer dense_search filters from a query. A filter is only returned when it is unambiguous:
+    exactly one Pokémon named, and at most one kind of section asked about (multi-part questions
+    stay unfiltered on section).
+    """
+    filters = {}
+
+    pokemon = find_pokemon(query, pokemon_names)
+    if len(pokemon) != 1:
+        return filters
+    filters["pokemon"] = next(iter(pokemon))
+
+    section_groups = find_sections(query, section_names)
+    if len(section_groups) == 1:
+        filters["sections"] = section_groups[0]
+
+    logger.debug("extract_search_filters: query='%s' filters=%s", query, filters)
+    return filters
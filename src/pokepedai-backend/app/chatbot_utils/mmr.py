@@ -0,0 +1,55 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MMR_LAMBDA = 0.7
+
+
+def normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def mmr_select(query_vec, cand_vecs, lengths, max_chars, lambda_=DEFAULT_MMR_LAMBDA):
+    """
+    Maximal marginal relevance selection under a character budget.
+    Greedily picks the candidate maximizing
+        lambda * sim(query, c) - (1 - lambda) * max sim(c, already selected)
+    among candidates that still fit in `max_chars`. Returns candidate positions in pick order.
+    """
+    n = len(cand_vecs)
+    if n == 0:
+        return []
+
+    cands = normalize_rows(np.asarray(cand_vecs, dtype="float32"))
+    query = normalize_rows(np.asarray(query_vec, dtype="float32").reshape(1, -1))[0]
+    lengths = np.asarray(lengths)
+
+    relevance = cands @ query
+    similarity = cands @ cands.T
+    # redundancy of each candidate against the selected set, nothing selected yet
+    redundancy = np.zeros(n, dtype="float32")
+    available = lengths <= max_chars
+
+    selected = []
+    budget = max_chars
+    while available.any():
+        scores = lambda_ * relevance - (1 - lambda_) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+
+        selected.append(best)
+        budget -= lengths[best]
+        available[best] = False
+        available &= lengths <= budget
+        np.maximum(redundancy, similarity[best], out=redundancy)
+
+    logger.debug(
+        "mmr_select: candidates=%d selected=%d chars=%d",
+        n,
+        len(selected),
+        max_chars - budget,
+    )
+    return selected
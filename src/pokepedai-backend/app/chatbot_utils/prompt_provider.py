@@ -1,4 +1,4 @@
-def make_rewrite_with_history_prompt(convo, query):
+def make_rewrite_with_history_prompt(convo, query, previous_query=None):
     return f"""You are a helpful assistant.
 
 Your task:
@@ -19,6 +19,9 @@ Rules:
 Conversation so far:
 {convo or "(no previous conversation)"}
 
+Previous standalone question:
+{previous_query or "(none)"}
+
 Latest user question:
 {query}
 """
@@ -218,6 +221,39 @@ Do NOT include any other lines, explanations, or XML tags.
 """
 
 
+def make_decomposition_prompt(query, max_subqueries):
+    return f"""<task>
+You are the retrieval planner for a Pokédex knowledge base.
+Split the question below into the separate lookups needed to answer it,
+so they can all be searched at once.
+</task>
+
+<question>
+{query}
+</question>
+
+<rules>
+- Each sub-query must be a standalone, retrieval-friendly question about ONE fact
+  (e.g. a type, a weakness, a location, a learnset, a move's PP).
+- Repeat the Pokémon, move or ability name in every sub-query; never use "it" or "its".
+- Do NOT answer anything and do NOT invent names that are not in the question.
+- Use at most {max_subqueries} sub-queries.
+- If the question only asks for one thing, output it once, unchanged.
+</rules>
+
+<example>
+Q: What is Bulbasaur's type, what is it weak to and where can I catch it?
+QUERY: What type is Bulbasaur?
+QUERY: What types is Bulbasaur weak against?
+QUERY: Where can Bulbasaur be caught?
+</example>
+
+<output_format>
+One line per sub-query, each starting with 'QUERY: '. No other lines.
+</output_format>
+"""
+
+
 def make_answer_prompt(context, query):
     return f"""<assistant_role>
 You are a Pokédex-style assistant that answers questions about all generations of official Pokémon games.
@@ -23,6 +23,32 @@ def extract_search_query(text):
             return s
     return text.strip()
 
+def extract_search_queries(text, max_queries):
+    """
+    Extract every 'QUERY:' line from planner output, deduplicated, at most `max_queries`.
+    """
+    queries = []
+    for line in (text or "").splitlines():
+        if line.strip().upper().startswith("QUERY:"):
+            q = line.split(":", 1)[1].strip()
+            if q and q not in queries:
+                queries.append(q)
+    return queries[:max_queries]
+
+def format_chunk(m):
+    """
+    Format one retrieved chunk the way it appears in the context.
+    """
+    if m.get("pokemon"):
+        header = f"[{m.get('pokemon')} — {m.get('section')}]"
+    else:
+        header = f"[{m.get('section')}]"
+    text = m.get("text") or ""
+
+    chunk_str = header + "\n"
+    chunk_str += text + "\n"
+    return chunk_str
+
 def build_context(results, max_chars: int = DEFAULT_MAX_CHARS):
     '''
     Build context to be input into chat prompt from retrieved RAG documents.
@@ -31,15 +57,7 @@ def build_context(results, max_chars: int = DEFAULT_MAX_CHARS):
     total_len = 0
 
     for r in results:
-        m = r["doc"]
-        if m.get("pokemon"):
-            header = f"[{m.get('pokemon')} — {m.get('section')}]"
-        else:
-            header = f"[{m.get('section')}]"
-        text = m.get("text") or ""
-
-        chunk_str = header + "\n"
-        chunk_str += text + "\n"
+        chunk_str = format_chunk(r["doc"])
 
         if total_len + len(chunk_str) > max_chars:
             break
@@ -88,3 +106,67 @@ def format_history(history, max_chars: int = DEFAULT_MAX_CHARS):
         len(text),
     )
     return text
+
+def merge_results(primary, secondary):
+    """
+    Merge two lists of retrieval results, keeping `primary` order first and dropping duplicate chunks.
+    """
+    if not secondary:
+        return primary
+
+    seen = {r["idx"] for r in primary}
+    merged = list(primary)
+    for r in secondary:
+        if r["idx"] not in seen:
+            seen.add(r["idx"])
+            merged.append(r)
+
+    logger.debug(
+        "merge_results: primary_len=%d merged_len=%d",
+        len(primary),
+        len(merged),
+    )
+    return merged
+
+
+def merge_with_quotas(results_per_query, k):
+    """
+    Merge per sub-query result lists into one list of at most k chunks.
+    Each sub-query first gets an equal quota (taken round robin, best first),
+    leftover slots go to the best remaining chunks by score.
+    """
+    if not results_per_query:
+        return []
+
+    quota = max(1, k // len(results_per_query))
+    seen = set()
+    merged = []
+    leftovers = []
+
+    for rank in range(max(len(r) for r in results_per_query)):
+        for results in results_per_query:
+            if rank >= len(results):
+                continue
+            r = results[rank]
+            if r["idx"] in seen:
+                continue
+            if rank < quota and len(merged) < k:
+                seen.add(r["idx"])
+                merged.append(r)
+            else:
+                leftovers.append(r)
+
+    for r in sorted(leftovers, key=lambda r: r["score"], reverse=True):
+        if len(merged) >= k:
+            break
+        if r["idx"] not in seen:
+            seen.add(r["idx"])
+            merged.append(r)
+
+    logger.debug(
+        "merge_with_quotas: subqueries=%d quota=%d merged_len=%d",
+        len(results_per_query),
+        quota,
+        len(merged),
+    )
+    return merged
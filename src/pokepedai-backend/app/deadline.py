@@ -0,0 +1,104 @@
+import logging
+import math
+import os
+import threading
+import time
+
+from .metrics import metrics
+
+logger = logging.getLogger("pokepedia.deadline")
+
+BUDGET_HEADER = "X-Request-Budget-Ms"
+DEFAULT_REQUEST_BUDGET = float(os.getenv("REQUEST_BUDGET_SECONDS", "60"))
+MAX_REQUEST_BUDGET = float(os.getenv("MAX_REQUEST_BUDGET_SECONDS", "120"))
+
+# used until a stage has observed latencies of its own
+DEFAULT_STAGE_ESTIMATES = {
+    "dense_search": 0.2,
+    "llm.rewrite": 2.0,
+    "llm.sufficiency": 2.0,
+    "llm.refinement": 3.0,
+    "llm.decompose": 3.0,
+    "llm.answer": 8.0,
+}
+ESTIMATE_PERCENTILE = 90
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised at a stage boundary once the request's budget is spent or its client went away.
+    """
+
+
+class Deadline:
+    def __init__(self, budget_seconds):
+        """
+        Latency budget for one request, checked by every pipeline stage before it starts work.
+        """
+        self.budget_seconds = budget_seconds
+        self.expires_at = time.monotonic() + budget_seconds
+        self._cancelled = threading.Event()
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def cancel(self):
+        """
+        Mark the request as abandoned (client disconnected), remaining stages are skipped.
+        """
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def expired(self):
+        return self.cancelled or self.remaining() <= 0
+
+    def check(self, stage):
+        if self.cancelled:
+            metrics.incr("deadline.cancelled")
+            raise DeadlineExceeded(f"request cancelled before {stage}")
+        if self.remaining() <= 0:
+            metrics.incr("deadline.expired")
+            raise DeadlineExceeded(f"request budget spent before {stage}")
+
+    def can_afford(self, seconds):
+        return not self.cancelled and self.remaining() >= seconds
+
+    def cap_timeout(self, timeout):
+        """
+        Clamp a stage timeout so it never outlives the request.
+        """
+        return min(timeout, self.remaining())
+
+
+def estimate_stage_seconds(stage):
+    """
+    Expected latency of a stage from observed timings, falling back to a static guess.
+    """
+    observed = metrics.percentile(f"{stage}.seconds", ESTIMATE_PERCENTILE)
+    if observed is not None:
+        return observed
+    return DEFAULT_STAGE_ESTIMATES.get(stage, 1.0)
+
+
+def deadline_from_header(value):
+    """
+    Build a deadline from the budget header (milliseconds), using the server default when absent
+    or invalid (not a finite, positive number) and never exceeding the server maximum.
+    """
+    budget = DEFAULT_REQUEST_BUDGET
+    if value:
+        try:
+            requested = float(value) / 1000
+        except ValueError:
+            requested = None
+        # nan / inf / <= 0 would otherwise give a zero budget, shed as "busy" by admission
+        if requested is not None and math.isfinite(requested) and requested > 0:
+            budget = requested
+        else:
+            logger.warning("Ignoring invalid %s header: %r", BUDGET_HEADER, value)
+    budget = min(budget, MAX_REQUEST_BUDGET)
+    return Deadline(budget)
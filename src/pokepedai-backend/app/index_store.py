@@ -0,0 +1,163 @@
+import hashlib
+import json
+import logging
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from .chatbot_utils.entities import build_name_index
+
+logger = logging.getLogger("pokepedia.index_store")
+
+EMPTY_IDS = np.empty(0, dtype="int64")
+
+# a reload that catches a publish half way retries this often before giving up
+PAIR_CHECK_ATTEMPTS = 5
+PAIR_CHECK_DELAY_SECONDS = 0.2
+
+
+class IndexStore:
+    def __init__(self, index, corpus_meta, version):
+        """
+        FAISS index and its metadata, swapped as one object so a search never mixes two builds.
+        corpus_meta[i] is the chunk for FAISS id i (None for ids deleted by incremental ingestion).
+        """
+        self.index = index
+        self.corpus_meta = corpus_meta
+        self.version = version
+        self.pokemon_postings, self.section_postings, self.general_ids = build_postings(
+            corpus_meta
+        )
+        # normalized name key -> name as stored, for entity extraction
+        self.pokemon_names = build_name_index(self.pokemon_postings)
+
+    def filter_ids(self, pokemon=None, sections=None):
+        """
+        Sorted FAISS ids matching the filters, None when no filter is given.
+        A Pokémon filter keeps the chunks that belong to no Pokémon (move details, type chart,
+        mechanics), questions about one Pokémon often need those too.
+        """
+        ids = None
+        if pokemon is not None:
+            ids = np.union1d(self.pokemon_postings.get(pokemon, EMPTY_IDS), self.general_ids)
+        if sections:
+            section_ids = np.unique(
+                np.concatenate([self.section_postings.get(s, EMPTY_IDS) for s in sections])
+            )
+            ids = (
+                section_ids
+                if ids is None
+                else np.intersect1d(ids, section_ids, assume_unique=True)
+            )
+        return ids
+
+
+def build_postings(corpus_meta):
+    """
+    Posting lists of FAISS ids per `pokemon` and per `section`, plus the ids of chunks without
+    a `pokemon`, as sorted int64 arrays.
+    """
+    pokemon_lists = {}
+    section_lists = {}
+    general = []
+    for idx, doc in enumerate(corpus_meta):
+        if not doc:
+            continue
+        if doc.get("pokemon"):
+            pokemon_lists.setdefault(doc["pokemon"], []).append(idx)
+        else:
+            general.append(idx)
+        if doc.get("section"):
+            section_lists.setdefault(doc["section"], []).append(idx)
+
+    pokemon_postings = {k: np.asarray(v, dtype="int64") for k, v in pokemon_lists.items()}
+    section_postings = {k: np.asarray(v, dtype="int64") for k, v in section_lists.items()}
+
+    logger.info(
+        "Built posting lists for %d pokemon and %d sections",
+        len(pokemon_postings),
+        len(section_postings),
+    )
+    return pokemon_postings, section_postings, np.asarray(general, dtype="int64")
+
+
+def file_version(path):
+    """
+    Build version for an index file: hash of its content, stable across copies and machines.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def bytes_version(data):
+    """
+    Same version string as file_version, for content that is still in memory.
+    """
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def publish_manifest_path(index_path):
+    """
+    Written by the ingest tool after publishing, pairs the index with the metadata published with it.
+    """
+    return Path(f"{index_path}.publish.json")
+
+
+def read_publish_manifest(index_path):
+    path = publish_manifest_path(index_path)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _load_pair(index_path, meta_path):
+    """
+    Index, metadata and their versions, read back to back.
+    """
+    index = faiss.read_index(str(index_path))
+    with open(meta_path, "rb") as f:
+        meta_bytes = f.read()
+    return index, json.loads(meta_bytes), file_version(index_path), bytes_version(meta_bytes)
+
+
+def load_index_store(index_path, meta_path):
+    """
+    Read a FAISS index and its metadata from disk.
+    When a publish manifest exists, the pair must match it: index and metadata are replaced one
+    after the other, so a reload racing a publish retries instead of pairing new metadata with the
+    old index.
+    """
+    logger.info("Loading FAISS index from %s", index_path)
+    for attempt in range(1, PAIR_CHECK_ATTEMPTS + 1):
+        manifest = read_publish_manifest(index_path)
+        index, corpus_meta, version, meta_version = _load_pair(index_path, meta_path)
+        if manifest is None or (
+            manifest.get("index") == version and manifest.get("metadata") == meta_version
+        ):
+            break
+        if attempt == PAIR_CHECK_ATTEMPTS:
+            raise ValueError(
+                f"{index_path} and {meta_path} don't match their publish manifest, "
+                "a publish may be in progress"
+            )
+        logger.warning("Index and metadata are from different publishes, retrying")
+        time.sleep(PAIR_CHECK_DELAY_SECONDS)
+
+    logger.info(
+        "Loaded %d chunks from metadata; FAISS index has %d vectors.",
+        len(corpus_meta),
+        index.ntotal,
+    )
+
+    if index.ntotal > len(corpus_meta):
+        raise ValueError(
+            f"FAISS index has {index.ntotal} vectors but metadata only {len(corpus_meta)} chunks"
+        )
+
+    return IndexStore(index, corpus_meta, version)
@@ -0,0 +1,411 @@
+"""
+Build or incrementally update the FAISS index and metadata served by the backend.
+
+    python -m app.ingest --source data/rag/json-data/rag-chunks.zip
+
+Sources are JSONL files (or zips / directories of them) with one scraped chunk per line
+(`id`, `section`, `text`, `metadata` and optionally `pokemon`), the format produced by the
+scraper notebook. Chunks are streamed, split if too long, embedded in batches across a process
+pool and written to an ID-mapped FAISS index. Progress is checkpointed to a state directory:
+a rerun after a crash skips everything already embedded, and later runs only embed chunks whose
+content hash changed. Outputs are replaced atomically; every server worker swaps them in on its
+next publish manifest poll (INDEX_POLL_SECONDS), or POST /admin/reload-index swaps the worker
+that handles it right away.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from .index_store import bytes_version, publish_manifest_path
+
+logger = logging.getLogger("pokepedia.ingest")
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR / "data"
+
+DEFAULT_MODEL = os.getenv("EMBED_MODEL_NAME", "all-MiniLM-L6-v2")
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_MAX_CHUNK_CHARS = 2000
+# write a checkpoint after this many embedded batches
+CHECKPOINT_EVERY = 20
+
+MANIFEST_NAME = "manifest.json"
+WORK_INDEX_NAME = "work.index"
+WORK_META_NAME = "work_metadata.json"
+
+# per worker process model, loaded once by the pool initializer
+_worker_model = None
+
+
+def clean_up_id(chunk_id):
+    return "-".join(part.capitalize() for part in chunk_id.split("-"))
+
+
+def iter_source_lines(path):
+    """
+    Yield raw JSONL lines from a file, a zip of JSONL files or a directory of either.
+    """
+    path = Path(path)
+    if path.is_dir():
+        for child in sorted(path.iterdir()):
+            if child.suffix in (".jsonl", ".zip"):
+                yield from iter_source_lines(child)
+    elif path.suffix == ".zip":
+        with zipfile.ZipFile(path) as zf:
+            for name in sorted(zf.namelist()):
+                if not name.endswith(".jsonl") or name.startswith("__MACOSX"):
+                    continue
+                with zf.open(name) as raw:
+                    yield from io.TextIOWrapper(raw, encoding="utf-8")
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from f
+
+
+def iter_documents(paths):
+    """
+    Stream source documents from every path, skipping blank and malformed lines.
+    """
+    for path in paths:
+        for line_no, line in enumerate(iter_source_lines(path), start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning("Skipping malformed line %d in %s", line_no, path)
+
+
+def split_text(text, max_chars):
+    """
+    Split text into pieces of at most max_chars, breaking on line boundaries where possible.
+    """
+    if len(text) <= max_chars:
+        return [text]
+
+    pieces = []
+    current = ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        if len(current) + len(line) > max_chars:
+            pieces.append(current)
+            current = ""
+        current += line
+    if current:
+        pieces.append(current)
+    return [p.strip() for p in pieces if p.strip()]
+
+
+def embedding_text(doc):
+    """
+    Text that gets embedded for a chunk, matching the encoder notebook the shipped index was built with.
+    The notebook checks `move_name` at the top level, where the scraped chunks never have it, so move
+    chunks are embedded with their id header (`Move-Absorb-Gen1. Section: ...`); kept as is so
+    incremental updates stay consistent with the vectors already in the index.
+    """
+    if doc.get("pokemon"):
+        parts = [f'Pokemon: {doc["pokemon"]}. Section: {doc["section"]}.']
+    elif doc.get("move_name"):
+        parts = [f'Move: {doc["metadata"]["move_name"]}.']
+    else:
+        parts = [f'{clean_up_id(doc["id"])}. Section: {doc["section"]}.']
+    parts.append(doc["text"])
+    return " ".join(parts)
+
+
+def chunk_document(doc, max_chars=DEFAULT_MAX_CHUNK_CHARS):
+    """
+    Turn one source document into metadata entries in the schema build_context expects
+    (`pokemon`, `section`, `text`), keyed by a stable chunk key.
+    """
+    pieces = split_text(doc.get("text") or "", max_chars)
+    for n, piece in enumerate(pieces):
+        key = doc["id"] if len(pieces) == 1 else f'{doc["id"]}#{n}'
+        meta = {
+            "id": key,
+            "section": doc.get("section"),
+            "text": piece,
+            "metadata": doc.get("metadata", {}),
+        }
+        if doc.get("pokemon"):
+            meta["pokemon"] = doc["pokemon"]
+
+        text = embedding_text({**doc, "text": piece})
+        content_hash = hashlib.sha256(
+            (text + json.dumps(meta, sort_keys=True, ensure_ascii=False)).encode("utf-8")
+        ).hexdigest()
+        yield key, content_hash, text, meta
+
+
+def _init_worker(model_name):
+    global _worker_model
+    # each worker gets one core's worth of torch threads, the pool provides the parallelism
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(1)
+    _worker_model = SentenceTransformer(model_name)
+
+
+def _embed_batch(texts):
+    vectors = _worker_model.encode(texts, convert_to_tensor=False, batch_size=64)
+    return np.asarray(vectors, dtype="float32")
+
+
+def _atomic_write_bytes(path, data):
+    tmp = Path(f"{path}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _atomic_write_json(path, obj):
+    _atomic_write_bytes(path, json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+
+
+def _atomic_write_index(path, index):
+    _atomic_write_bytes(path, faiss.serialize_index(index).tobytes())
+
+
+class IngestState:
+    def __init__(self, state_dir, model_name):
+        """
+        Checkpointed build state: ID-mapped working index, metadata by FAISS id and a manifest
+        mapping chunk keys to their FAISS id and content hash.
+        """
+        self.state_dir = Path(state_dir)
+        self.model_name = model_name
+        self.chunks = {}
+        self.next_id = 0
+        self.index = None
+        self.corpus_meta = []
+
+        manifest_path = self.state_dir / MANIFEST_NAME
+        if manifest_path.exists():
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest["model"] != model_name:
+                raise ValueError(
+                    f"State was built with {manifest['model']}, not {model_name}; use a new --state-dir"
+                )
+            self.chunks = manifest["chunks"]
+            self.next_id = manifest["next_id"]
+            self.index = faiss.read_index(str(self.state_dir / WORK_INDEX_NAME))
+            with open(self.state_dir / WORK_META_NAME, "r", encoding="utf-8") as f:
+                self.corpus_meta = json.load(f)
+            logger.info(
+                "Resuming from checkpoint: %d chunks, %d vectors",
+                len(self.chunks),
+                self.index.ntotal,
+            )
+
+    def ensure_index(self, dim):
+        if self.index is None:
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+
+    def needs_embedding(self, key, content_hash):
+        entry = self.chunks.get(key)
+        return entry is None or entry["hash"] != content_hash
+
+    def upsert(self, keys, hashes, metas, vectors):
+        """
+        Add new chunks or replace changed ones, a changed chunk keeps its FAISS id.
+        """
+        self.ensure_index(vectors.shape[1])
+
+        ids = []
+        for key in keys:
+            entry = self.chunks.get(key)
+            if entry is None:
+                ids.append(self.next_id)
+                self.next_id += 1
+            else:
+                ids.append(entry["faiss_id"])
+
+        ids = np.asarray(ids, dtype="int64")
+        self.index.remove_ids(ids)
+        self.index.add_with_ids(vectors, ids)
+
+        if len(self.corpus_meta) < self.next_id:
+            self.corpus_meta.extend([None] * (self.next_id - len(self.corpus_meta)))
+        for key, content_hash, meta, faiss_id in zip(keys, hashes, metas, ids):
+            self.chunks[key] = {"faiss_id": int(faiss_id), "hash": content_hash}
+            self.corpus_meta[int(faiss_id)] = meta
+
+    def delete(self, keys):
+        if not keys or self.index is None:
+            return
+        ids = np.asarray([self.chunks[k]["faiss_id"] for k in keys], dtype="int64")
+        self.index.remove_ids(ids)
+        for key, faiss_id in zip(keys, ids):
+            self.corpus_meta[int(faiss_id)] = None
+            del self.chunks[key]
+
+    def checkpoint(self):
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        if self.index is not None:
+            _atomic_write_index(self.state_dir / WORK_INDEX_NAME, self.index)
+        _atomic_write_json(self.state_dir / WORK_META_NAME, self.corpus_meta)
+        # manifest last: it only ever points at data that is already on disk
+        _atomic_write_json(
+            self.state_dir / MANIFEST_NAME,
+            {"model": self.model_name, "next_id": self.next_id, "chunks": self.chunks},
+        )
+        logger.info("Checkpoint written: %d chunks", len(self.chunks))
+
+    def publish(self, index_path, meta_path):
+        """
+        Replace the served index and metadata with the current state. Each file is replaced
+        atomically, the publish manifest written last pairs them so a reload in between is detected.
+        """
+        index_bytes = faiss.serialize_index(self.index).tobytes()
+        meta_bytes = json.dumps(self.corpus_meta, ensure_ascii=False).encode("utf-8")
+        _atomic_write_bytes(meta_path, meta_bytes)
+        _atomic_write_bytes(index_path, index_bytes)
+        _atomic_write_json(
+            publish_manifest_path(index_path),
+            {"index": bytes_version(index_bytes), "metadata": bytes_version(meta_bytes)},
+        )
+        logger.info(
+            "Published %d vectors to %s (metadata %s)",
+            self.index.ntotal,
+            index_path,
+            meta_path,
+        )
+
+
+def _batches(docs, state, batch_size, max_chars, seen_keys):
+    batch = []
+    for doc in docs:
+        for key, content_hash, text, meta in chunk_document(doc, max_chars):
+            seen_keys.add(key)
+            if not state.needs_embedding(key, content_hash):
+                continue
+            batch.append((key, content_hash, text, meta))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def run_ingest(
+    sources,
+    index_path,
+    meta_path,
+    state_dir,
+    model_name=DEFAULT_MODEL,
+    batch_size=DEFAULT_BATCH_SIZE,
+    workers=None,
+    max_chars=DEFAULT_MAX_CHUNK_CHARS,
+    delete_missing=False,
+):
+    state = IngestState(state_dir, model_name)
+    seen_keys = set()
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+
+    embedded = 0
+    batches_since_checkpoint = 0
+    pending = []
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(model_name,)
+    ) as pool:
+        batches = _batches(iter_documents(sources), state, batch_size, max_chars, seen_keys)
+
+        def drain(limit):
+            nonlocal embedded, batches_since_checkpoint
+            # results are applied in submission order, so a checkpoint is always a prefix of the stream
+            while len(pending) > limit:
+                batch, future = pending.pop(0)
+                vectors = future.result()
+                keys, hashes, _, metas = zip(*batch)
+                state.upsert(list(keys), list(hashes), list(metas), vectors)
+                embedded += len(batch)
+                batches_since_checkpoint += 1
+                if batches_since_checkpoint >= CHECKPOINT_EVERY:
+                    state.checkpoint()
+                    batches_since_checkpoint = 0
+
+        for batch in batches:
+            texts = [text for _, _, text, _ in batch]
+            pending.append((batch, pool.submit(_embed_batch, texts)))
+            # keep the pool busy without reading the whole corpus into memory
+            drain(workers * 2)
+        drain(0)
+
+    removed = []
+    if delete_missing:
+        removed = [key for key in state.chunks if key not in seen_keys]
+        state.delete(removed)
+
+    if state.index is None:
+        raise ValueError("No chunks were ingested; check --source")
+
+    state.checkpoint()
+    state.publish(index_path, meta_path)
+    logger.info(
+        "Ingest done: %d chunks embedded, %d deleted, %d total",
+        embedded,
+        len(removed),
+        len(state.chunks),
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--source", nargs="+", required=True, help="JSONL files, zips or directories")
+    parser.add_argument("--index-path", default=str(DATA_DIR / "pokemon_faiss.index"))
+    parser.add_argument("--meta-path", default=str(DATA_DIR / "pokemon_metadata.json"))
+    parser.add_argument("--state-dir", default=str(DATA_DIR / "ingest_state"))
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-chunk-chars", type=int, default=DEFAULT_MAX_CHUNK_CHARS)
+    parser.add_argument(
+        "--delete-missing",
+        action="store_true",
+        help="treat the sources as the full corpus and delete chunks not present in them",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+    )
+    args = parse_args(argv)
+    run_ingest(
+        sources=args.source,
+        index_path=args.index_path,
+        meta_path=args.meta_path,
+        state_dir=args.state_dir,
+        model_name=args.model,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        max_chars=args.max_chunk_chars,
+        delete_missing=args.delete_missing,
+    )
+
+
+if __name__ == "__main__":
+    main()
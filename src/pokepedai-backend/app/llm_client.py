@@ -0,0 +1,367 @@
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import httpx
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    OpenAI,
+    RateLimitError,
+)
+
+from .deadline import DeadlineExceeded
+from .metrics import metrics
+from .request_trace import trace_stage
+
+logger = logging.getLogger("pokepedia.llm_client")
+
+DEFAULT_MODEL = "gpt-4.1-mini"
+
+# per-stage request timeouts in seconds
+STAGE_TIMEOUTS = {
+    "rewrite": float(os.getenv("LLM_TIMEOUT_REWRITE", "10")),
+    "sufficiency": float(os.getenv("LLM_TIMEOUT_SUFFICIENCY", "10")),
+    "refinement": float(os.getenv("LLM_TIMEOUT_REFINEMENT", "15")),
+    "decompose": float(os.getenv("LLM_TIMEOUT_DECOMPOSE", "15")),
+    "answer": float(os.getenv("LLM_TIMEOUT_ANSWER", "45")),
+}
+DEFAULT_STAGE_TIMEOUT = 30.0
+
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.25"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "4"))
+# each call earns this fraction of a retry, so retries stay below ~20% of traffic
+LLM_RETRY_BUDGET_RATIO = float(os.getenv("LLM_RETRY_BUDGET_RATIO", "0.2"))
+
+LLM_HEDGING = os.getenv("LLM_HEDGING", "false").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+# hedging waits for this many observed calls per stage before trusting the percentile
+LLM_HEDGE_MIN_SAMPLES = 20
+
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+
+RETRYABLE_ERRORS = (
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling upstream while a stage's circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, reset_timeout):
+        """
+        Opens after failure_threshold consecutive failures, lets one trial call through
+        after reset_timeout seconds and closes again when it succeeds.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            # half open, only one trial call at a time
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """
+        End a call that says nothing about upstream health (e.g. the request ran out of budget).
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+
+class RetryBudget:
+    def __init__(self, ratio, max_tokens=10.0):
+        """
+        Token bucket shared by all stages: every call deposits `ratio` tokens and every retry spends one,
+        so an upstream outage can't multiply traffic by the retry count.
+        """
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class LLMClient:
+    def __init__(self, api_key, hedging=LLM_HEDGING):
+        """
+        Shared wrapper around the OpenAI client used by every pipeline stage: pooled keep-alive
+        connections, per-stage timeouts, jittered retries under a budget, optional hedging and
+        a circuit breaker per stage.
+        """
+        http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=DEFAULT_STAGE_TIMEOUT,
+        )
+        # retries are handled here so they count against the budget
+        self.client = OpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+        self.hedging = hedging
+        self.retry_budget = RetryBudget(LLM_RETRY_BUDGET_RATIO)
+        self._breakers = {}
+        self._breakers_lock = threading.Lock()
+        self._hedge_pool = ThreadPoolExecutor(
+            max_workers=LLM_MAX_CONNECTIONS, thread_name_prefix="llm-hedge"
+        )
+
+    def breaker(self, stage):
+        with self._breakers_lock:
+            if stage not in self._breakers:
+                self._breakers[stage] = CircuitBreaker(
+                    LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_SECONDS
+                )
+            return self._breakers[stage]
+
+    def complete(self, stage, prompt, model=DEFAULT_MODEL, timeout=None, deadline=None):
+        """
+        Run one responses.create call for `stage` and return its stripped output text.
+        Raises CircuitOpenError when the stage's breaker is open, DeadlineExceeded when the
+        request's deadline is spent, otherwise the last upstream error.
+        """
+        if deadline:
+            deadline.check(f"llm.{stage}")
+
+        breaker = self.breaker(stage)
+        if not breaker.allow():
+            metrics.incr(f"llm.{stage}.short_circuited")
+            raise CircuitOpenError(f"circuit open for stage '{stage}'")
+
+        timeout = timeout or STAGE_TIMEOUTS.get(stage, DEFAULT_STAGE_TIMEOUT)
+        self.retry_budget.deposit()
+
+        attempt = 0
+        while True:
+            call_timeout = deadline.cap_timeout(timeout) if deadline else timeout
+            start = time.monotonic()
+            try:
+                text = self._call(stage, prompt, model, call_timeout)
+            except RETRYABLE_ERRORS as exc:
+                if isinstance(exc, APITimeoutError) and call_timeout < timeout:
+                    raise self._budget_timeout(stage, breaker) from exc
+                breaker.record_failure()
+                metrics.incr(f"llm.{stage}.errors")
+
+                # full jitter exponential backoff
+                delay = random.uniform(
+                    0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt))
+                )
+
+                if (
+                    attempt >= LLM_MAX_RETRIES
+                    or breaker.is_open
+                    or (deadline and not deadline.can_afford(delay))
+                    or not self.retry_budget.withdraw()
+                ):
+                    raise
+                attempt += 1
+                metrics.incr(f"llm.{stage}.retries")
+                logger.warning(
+                    "LLM stage %s failed (%s), retry %d in %.2fs",
+                    stage,
+                    type(exc).__name__,
+                    attempt,
+                    delay,
+                )
+                time.sleep(delay)
+                continue
+            except Exception:
+                # upstream answered (e.g. a bad request), so it still counts as healthy
+                breaker.record_success()
+                metrics.incr(f"llm.{stage}.errors")
+                raise
+
+            breaker.record_success()
+            seconds = time.monotonic() - start
+            metrics.observe(f"llm.{stage}.seconds", seconds)
+            trace_stage(f"llm.{stage}", seconds)
+            return text
+
+    def stream(
+        self,
+        stage,
+        prompt,
+        model=DEFAULT_MODEL,
+        timeout=None,
+        deadline=None,
+        cancel=None,
+    ):
+        """
+        Stream one responses.create call for `stage`, stopping early once `cancel` (a threading.Event)
+        is set or the deadline is cancelled; closing the stream stops generation upstream.
+        No retries or hedging. Returns {"text", "input_tokens", "output_tokens", "completed"}, token
+        counts come from the final usage or, for a stream cut short, from the deltas received.
+        """
+        if deadline:
+            deadline.check(f"llm.{stage}")
+
+        breaker = self.breaker(stage)
+        if not breaker.allow():
+            metrics.incr(f"llm.{stage}.short_circuited")
+            raise CircuitOpenError(f"circuit open for stage '{stage}'")
+
+        timeout = timeout or STAGE_TIMEOUTS.get(stage, DEFAULT_STAGE_TIMEOUT)
+        call_timeout = deadline.cap_timeout(timeout) if deadline else timeout
+        start = time.monotonic()
+
+        parts = []
+        input_tokens = None
+        output_tokens = 0
+        completed = False
+        try:
+            with self.client.responses.create(
+                model=model,
+                input=prompt,
+                timeout=call_timeout,
+                stream=True,
+            ) as events:
+                for event in events:
+                    if (cancel is not None and cancel.is_set()) or (
+                        deadline and deadline.cancelled
+                    ):
+                        break
+                    if event.type == "response.output_text.delta":
+                        parts.append(event.delta)
+                        # one delta per generated token, close enough for accounting
+                        output_tokens += 1
+                    elif event.type == "response.completed":
+                        usage = event.response.usage
+                        if usage:
+                            input_tokens = usage.input_tokens
+                            output_tokens = usage.output_tokens
+                        completed = True
+        except RETRYABLE_ERRORS as exc:
+            if isinstance(exc, APITimeoutError) and call_timeout < timeout:
+                raise self._budget_timeout(stage, breaker) from exc
+            breaker.record_failure()
+            metrics.incr(f"llm.{stage}.errors")
+            raise
+        except Exception:
+            breaker.record_success()
+            metrics.incr(f"llm.{stage}.errors")
+            raise
+
+        breaker.record_success()
+        seconds = time.monotonic() - start
+        trace_stage(f"llm.{stage}.stream", seconds)
+        if completed:
+            metrics.observe(f"llm.{stage}.seconds", seconds)
+        else:
+            metrics.incr(f"llm.{stage}.streams_cancelled")
+
+        return {
+            "text": "".join(parts).strip(),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "completed": completed,
+        }
+
+    def _budget_timeout(self, stage, breaker):
+        """
+        A timeout shortened to the request's remaining budget is the client's budget running out,
+        not an upstream failure, so it must not count against the breaker every request shares.
+        """
+        breaker.release_trial()
+        metrics.incr(f"llm.{stage}.budget_timeouts")
+        return DeadlineExceeded(f"request budget spent during llm.{stage}")
+
+    def _create(self, prompt, model, timeout):
+        response = self.client.responses.create(
+            model=model,
+            input=prompt,
+            timeout=timeout,
+        )
+        return (response.output_text or "").strip()
+
+    def _hedge_delay(self, stage):
+        """
+        Seconds to wait before sending a duplicate request, None when hedging is off or untrained.
+        """
+        if not self.hedging:
+            return None
+        if metrics.count(f"llm.{stage}.seconds") < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return metrics.percentile(f"llm.{stage}.seconds", LLM_HEDGE_PERCENTILE)
+
+    def _call(self, stage, prompt, model, timeout):
+        hedge_delay = self._hedge_delay(stage)
+        if hedge_delay is None:
+            return self._create(prompt, model, timeout)
+
+        primary = self._hedge_pool.submit(self._create, prompt, model, timeout)
+        done, _ = wait([primary], timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        # primary is past the stage's tail latency, race a duplicate against it
+        metrics.incr(f"llm.{stage}.hedges_sent")
+        hedge = self._hedge_pool.submit(self._create, prompt, model, timeout)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        metrics.incr(f"llm.{stage}.hedges_won")
+                    # the loser can't be interrupted, its result is simply dropped
+                    return future.result()
+                error = future.exception()
+        raise error
@@ -1,15 +1,33 @@
+import asyncio
 import logging
+import os
+import secrets
+import threading
 import time
-from typing import List, Literal
+from typing import List, Literal, Optional
 
-from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
-from .chatbot_logic import answer_with_rag
+from .admission import admission_controller
+from .chatbot_logic import answer_with_rag, reload_if_published, reload_index, warm_caches
+from .deadline import BUDGET_HEADER, DeadlineExceeded, deadline_from_header
+from .metrics import metrics
+from .profiles import PROFILE_HEADER, resolve_profile
+from .profiling import DEFAULT_PROFILE_HZ, ProfilerBusy, profile_worker
 from .rate_limiter import RateLimiter
+from .request_trace import (
+    SLOW_REQUEST_SECONDS,
+    RequestTrace,
+    current_trace,
+    slow_requests,
+    stage_timer,
+)
+from .session_store import session_store
 
 # logger setup
 logging.basicConfig(
@@ -18,6 +36,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger("pokepedia.backend")
 
+# how often a running /chat request checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 0.5
+# how often each worker checks the publish manifest for a new index, 0 disables polling
+INDEX_POLL_SECONDS = float(os.getenv("INDEX_POLL_SECONDS", "30"))
+
+# admin routes are disabled unless a token is configured
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
 # pydandic models
 class ChatMessage(BaseModel):
     role: Literal["user", "assistant"]
@@ -25,12 +51,27 @@ class ChatMessage(BaseModel):
 
 
 class ChatRequest(BaseModel):
-    history: List[ChatMessage]
+    history: List[ChatMessage] = []
     message: str
+    session_id: Optional[str] = None
+    profile: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
     reply: str
+    session_id: Optional[str] = None
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    """
+    Dependency guarding admin routes with the X-Admin-Token header.
+    """
+    if not ADMIN_TOKEN or not x_admin_token or not secrets.compare_digest(
+        x_admin_token, ADMIN_TOKEN
+    ):
+        logger.warning("Rejected admin request with missing or invalid token")
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return True
 
 def configure_cors(app):
     """
@@ -68,6 +109,7 @@ def configure_exception_handlers(app):
         return JSONResponse(
             status_code=exc.status_code,
             content={"error": exc.detail},
+            headers=getattr(exc, "headers", None),
         )
 
     @app.exception_handler(Exception)
@@ -111,6 +153,41 @@ def configure_middlewares(app):
         )
         return response
 
+def configure_startup(app):
+    """
+    Warm caches from the popular-query snapshot before the worker reports ready,
+    then poll the publish manifest so every worker picks up a newly published index
+    """
+
+    app.state.ready = False
+    app.state.index_poller = None
+
+    async def poll_published_index():
+        while True:
+            await asyncio.sleep(INDEX_POLL_SECONDS)
+            try:
+                await run_in_threadpool(reload_if_published)
+            except Exception:
+                metrics.incr("index.reload_errors")
+                logger.exception("Failed to reload published index, keeping the current one")
+
+    @app.on_event("startup")
+    async def warm_up():
+        try:
+            loaded = await run_in_threadpool(warm_caches)
+            logger.info("Warm-up done, %d popular queries preloaded", loaded)
+        except Exception:
+            logger.exception("Cache warm-up failed, starting with cold caches")
+        app.state.ready = True
+        if INDEX_POLL_SECONDS > 0:
+            app.state.index_poller = asyncio.create_task(poll_published_index())
+
+    @app.on_event("shutdown")
+    async def stop_index_poller():
+        if app.state.index_poller is not None:
+            app.state.index_poller.cancel()
+
+
 def register_routes(app):
     """
     Setup chatbot route and health
@@ -121,27 +198,150 @@ def register_routes(app):
         logger.debug("Health check called")
         return {"status": "ok"}
 
+    @app.get("/ready")
+    def readiness_check():
+        if not app.state.ready:
+            raise HTTPException(status_code=503, detail="Warming up")
+        return {"status": "ready"}
+
+    @app.get("/metrics")
+    def get_metrics():
+        return metrics.snapshot()
+
+    @app.post("/admin/reload-index", dependencies=[Depends(require_admin)])
+    def admin_reload_index():
+        """
+        Reload the index in the worker that handles this request. Other workers pick up
+        a published index on their next manifest poll (INDEX_POLL_SECONDS).
+        """
+        try:
+            store = reload_index()
+        except Exception:
+            logger.exception("Failed to reload FAISS index, keeping the current one")
+            raise HTTPException(status_code=500, detail="Failed to reload index.")
+        return {"version": store.version, "vectors": store.index.ntotal}
+
+    @app.post("/admin/profile", dependencies=[Depends(require_admin)])
+    async def admin_profile(
+        seconds: float = 10, hz: int = DEFAULT_PROFILE_HZ, idle: bool = False
+    ):
+        try:
+            document = await run_in_threadpool(profile_worker, seconds, hz, idle)
+        except ProfilerBusy as exc:
+            raise HTTPException(status_code=409, detail=str(exc))
+        return JSONResponse(
+            document,
+            headers={
+                "Content-Disposition": (
+                    f'attachment; filename="profile-{int(time.time())}.speedscope.json"'
+                )
+            },
+        )
+
+    @app.get("/admin/slow-requests", dependencies=[Depends(require_admin)])
+    def admin_slow_requests():
+        return JSONResponse(
+            {
+                "threshold_seconds": SLOW_REQUEST_SECONDS,
+                "requests": slow_requests.entries(),
+            },
+            headers={
+                "Content-Disposition": 'attachment; filename="slow-requests.json"'
+            },
+        )
+
     @app.post(
         "/chat",
         response_model=ChatResponse,
         dependencies=[Depends(RateLimiter(requests_limit=10, time_window=60))],
     )
-    def chat(body: ChatRequest):
+    async def chat(body: ChatRequest, request: Request):
         logger.info("Handling /chat request with %d history messages", len(body.history))
 
+        deadline = deadline_from_header(request.headers.get(BUDGET_HEADER))
+        profile = resolve_profile(body.profile or request.headers.get(PROFILE_HEADER))
+        trace = RequestTrace(request.url.path, profile.name)
+        status = 500
+
+        try:
+            queued_at = time.monotonic()
+            async with admission_controller.admit(deadline) as admission:
+                trace.add("admission_wait", time.monotonic() - queued_at)
+                max_loops = admission.max_loops(profile.max_loops)
+                task = asyncio.ensure_future(
+                    run_in_threadpool(run_chat, body, profile, max_loops, deadline, trace)
+                )
+
+                # cancel the pipeline if the client gives up, nobody will read the answer
+                while not task.done():
+                    await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+                    trace.watch()
+                    if not task.done() and await request.is_disconnected():
+                        logger.info("Client disconnected, cancelling /chat pipeline")
+                        deadline.cancel()
+                        break
+
+                response = await task
+                status = 200
+                return response
+        except HTTPException as exc:
+            status = exc.status_code
+            raise
+        finally:
+            trace.finish(status)
+
+    def run_chat(body: ChatRequest, profile, max_loops: int, deadline, trace=None):
+        """
+        Run the blocking RAG pipeline for an admitted /chat request.
+        """
+        token = current_trace.set(trace)
+        if trace is not None:
+            # the slow-request profiler samples this thread
+            trace.thread_ids.add(threading.get_ident())
         try:
-            history = [m.model_dump() for m in body.history]
-            reply = answer_with_rag(query=body.message, history=history, debug=False)
+            session = None
+            with stage_timer("history_dump"):
+                history = [m.model_dump() for m in body.history]
+
+            # session mode: server keeps the history, fall back to the payload if the session expired
+            if body.session_id is not None:
+                session = session_store.get_or_create(body.session_id or None)
+                session_history, _, _ = session.snapshot()
+                if session_history:
+                    history = session_history
+
+            reply = answer_with_rag(
+                query=body.message,
+                history=history,
+                max_loops=max_loops,
+                session=session,
+                debug=False,
+                deadline=deadline,
+                profile=profile,
+            )
             logger.info("Successfully generated reply for /chat")
-            return ChatResponse(reply=reply)
+            return ChatResponse(
+                reply=reply,
+                session_id=session.session_id if session else None,
+            )
         except HTTPException:
             raise
+        except DeadlineExceeded as exc:
+            logger.warning("Stopped /chat pipeline: %s", exc)
+            raise HTTPException(
+                status_code=504,
+                detail="The request ran out of time, please try again.",
+            )
         except Exception:
             logger.exception("Error while handling /chat")
             raise HTTPException(
                 status_code=500,
                 detail="Failed to generate a reply.",
             )
+        finally:
+            if trace is not None:
+                trace.thread_ids.discard(threading.get_ident())
+            current_trace.reset(token)
 
 
 def create_app():
@@ -153,6 +353,7 @@ def create_app():
     configure_cors(app)
     configure_exception_handlers(app)
     configure_middlewares(app)
+    configure_startup(app)
     register_routes(app)
     return app
 
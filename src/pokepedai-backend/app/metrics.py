@@ -0,0 +1,97 @@
+import logging
+import threading
+from collections import defaultdict, deque
+from typing import Dict
+
+logger = logging.getLogger("pokepedia.metrics")
+
+# number of recent observations kept per series for percentiles
+DEFAULT_WINDOW = 512
+
+
+class LatencySeries:
+    def __init__(self, window=DEFAULT_WINDOW):
+        """
+        Running count/sum/max plus a window of recent values for percentiles.
+        """
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.recent.append(value)
+
+    def percentile(self, pct):
+        """
+        Return the pct percentile of the recent window, None if nothing observed yet.
+        """
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        pos = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[pos]
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class Metrics:
+    def __init__(self):
+        """
+        Process local counters, gauges and latency series, exported as json on /metrics.
+        """
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._series: Dict[str, LatencySeries] = {}
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name, value):
+        with self._lock:
+            series = self._series.get(name)
+            if series is None:
+                series = self._series[name] = LatencySeries()
+            series.observe(value)
+
+    def counter(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def count(self, name):
+        with self._lock:
+            series = self._series.get(name)
+            return series.count if series else 0
+
+    def percentile(self, name, pct):
+        with self._lock:
+            series = self._series.get(name)
+            return series.percentile(pct) if series else None
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "latencies": {k: v.snapshot() for k, v in self._series.items()},
+            }
+
+
+metrics = Metrics()
@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from .chatbot_utils.mmr import DEFAULT_MMR_LAMBDA
+from .llm_client import DEFAULT_MODEL
+
+logger = logging.getLogger("pokepedia.profiles")
+
+PROFILE_HEADER = "X-Pipeline-Profile"
+DEFAULT_PROFILE = os.getenv("DEFAULT_PIPELINE_PROFILE", "balanced")
+# optional json file of {name: profile} that overrides / extends the built-in profiles
+PROFILES_PATH = os.getenv("PIPELINE_PROFILES_PATH")
+# comma separated profile names clients may select, empty allows all
+ALLOWED_PROFILES = [p for p in os.getenv("ALLOWED_PIPELINE_PROFILES", "").split(",") if p]
+
+# server enforced limits, profiles are clamped to these
+MAX_PROFILE_LOOPS = int(os.getenv("MAX_PROFILE_LOOPS", "6"))
+MAX_PROFILE_K = int(os.getenv("MAX_PROFILE_K", "20"))
+MAX_PROFILE_CONTEXT_CHARS = int(os.getenv("MAX_PROFILE_CONTEXT_CHARS", "8000"))
+
+
+class PipelineProfile(BaseModel):
+    name: str
+    max_loops: int = 4
+    k: int = 8
+    max_context_chars: int = 3200
+    # stage -> model, stages not listed use DEFAULT_MODEL
+    models: Dict[str, str] = {}
+    rewrite: bool = True
+    sufficiency: bool = True
+    # plan several sub-queries up front and search them in one batch
+    decompose: bool = False
+    max_subqueries: int = 4
+    # MMR diversity rerank over k * mmr_fetch_factor candidates, lambda trades relevance vs redundancy
+    rerank: bool = True
+    mmr_lambda: float = DEFAULT_MMR_LAMBDA
+    mmr_fetch_factor: int = 3
+    # stream the answer for the loop-1 context while the sufficiency judge runs, dropped on NO
+    speculate: bool = False
+
+    def model_for(self, stage):
+        return self.models.get(stage, DEFAULT_MODEL)
+
+    def clamped(self):
+        """
+        Copy of the profile within the server limits.
+        """
+        return self.model_copy(
+            update={
+                "max_loops": max(1, min(self.max_loops, MAX_PROFILE_LOOPS)),
+                "k": max(1, min(self.k, MAX_PROFILE_K)),
+                "mmr_fetch_factor": max(1, min(self.mmr_fetch_factor, 5)),
+                "mmr_lambda": max(0.0, min(self.mmr_lambda, 1.0)),
+                "max_context_chars": max(
+                    500, min(self.max_context_chars, MAX_PROFILE_CONTEXT_CHARS)
+                ),
+            }
+        )
+
+
+BUILTIN_PROFILES = {
+    # interactive one-loop path: no sufficiency judge, cheaper rewrite
+    "fast": PipelineProfile(
+        name="fast",
+        max_loops=1,
+        k=6,
+        max_context_chars=2400,
+        models={"rewrite": "gpt-4.1-nano"},
+        sufficiency=False,
+    ),
+    # the original loop, k and context settings, most questions are sufficient on loop 1
+    "balanced": PipelineProfile(name="balanced", speculate=True),
+    # offline / batch use, more loops and a bigger context
+    "thorough": PipelineProfile(
+        name="thorough",
+        max_loops=6,
+        k=12,
+        max_context_chars=6000,
+        decompose=True,
+    ),
+}
+
+
+def load_profiles(path=PROFILES_PATH):
+    """
+    Built-in profiles merged with the ones from the config file, all clamped to the server limits.
+    """
+    profiles = dict(BUILTIN_PROFILES)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            for name, fields in json.load(f).items():
+                profiles[name] = PipelineProfile(name=name, **fields)
+        logger.info("Loaded pipeline profiles from %s", path)
+
+    return {name: profile.clamped() for name, profile in profiles.items()}
+
+
+profiles = load_profiles()
+
+
+def resolve_profile(name: Optional[str] = None):
+    """
+    Profile requested by a client (or the default), 400 if unknown or not allowed.
+    """
+    requested = name
+    name = name or DEFAULT_PROFILE
+    if name not in profiles or (
+        requested and ALLOWED_PROFILES and name not in ALLOWED_PROFILES
+    ):
+        raise HTTPException(status_code=400, detail=f"Unknown pipeline profile '{name}'.")
+    return profiles[name]
@@ -0,0 +1,172 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger("pokepedia.profiling")
+
+DEFAULT_PROFILE_HZ = int(os.getenv("PROFILE_DEFAULT_HZ", "100"))
+MAX_PROFILE_HZ = 1000
+MAX_PROFILE_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+
+# leaf frames of threads parked on a lock, queue or socket, left out unless idle stacks are asked for
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("socket.py", "readinto"),
+    ("ssl.py", "read"),
+    ("thread.py", "_worker"),
+}
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+# one on-demand profile per worker at a time
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """
+    Raised when an on-demand profile is requested while another one is running.
+    """
+
+
+class SamplingProfiler:
+    def __init__(self, hz=DEFAULT_PROFILE_HZ, thread_ids=None, include_idle=False):
+        """
+        Statistical profiler over sys._current_frames(): every 1/hz seconds it records the Python
+        stack of each thread (or only `thread_ids`, a set that may change while sampling). Nothing
+        is installed in the profiled threads, so the cost is one stack walk per thread per sample
+        on the sampling thread.
+        """
+        self.interval = 1.0 / max(1, min(hz, MAX_PROFILE_HZ))
+        self.thread_ids = thread_ids
+        self.include_idle = include_idle
+        self.frames = {}
+        # (thread name, stack of frame indexes root first) -> samples
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _frame_index(self, code):
+        key = (code.co_filename, code.co_name, code.co_firstlineno)
+        index = self.frames.get(key)
+        if index is None:
+            index = self.frames[key] = len(self.frames)
+        return index
+
+    def _is_idle(self, frame):
+        code = frame.f_code
+        return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+    def sample_once(self):
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own or (
+                self.thread_ids is not None and thread_id not in self.thread_ids
+            ):
+                continue
+            if not self.include_idle and self._is_idle(frame):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_index(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks[(names.get(thread_id, str(thread_id)), tuple(stack))] += 1
+        self.samples += 1
+
+    def run(self, seconds):
+        """
+        Sample on the calling thread for `seconds` (or until stop()).
+        """
+        self.started_at = time.time()
+        start = time.monotonic()
+        next_sample = start
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if now - start >= seconds:
+                break
+            self.sample_once()
+            next_sample += self.interval
+            self._stop.wait(max(0.0, next_sample - time.monotonic()))
+        self.duration = time.monotonic() - start
+        return self
+
+    def start(self, max_seconds=MAX_PROFILE_SECONDS):
+        """
+        Sample on a background thread until stop() or max_seconds.
+        """
+        self._thread = threading.Thread(
+            target=self.run, args=(max_seconds,), name="profiler", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def to_speedscope(self, name):
+        """
+        Samples as a speedscope file (https://www.speedscope.app), one sampled profile per thread.
+        """
+        frames = [None] * len(self.frames)
+        for (filename, func, line), index in self.frames.items():
+            frames[index] = {"name": func, "file": filename, "line": line}
+
+        by_thread = {}
+        for (thread_name, stack), count in self.stacks.items():
+            samples, weights = by_thread.setdefault(thread_name, ([], []))
+            samples.append(list(stack))
+            weights.append(count * self.interval)
+
+        profiles = []
+        for thread_name, (samples, weights) in sorted(by_thread.items()):
+            profiles.append(
+                {
+                    "type": "sampled",
+                    "name": thread_name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            )
+
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": name,
+            "exporter": "pokepedia",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+
+def profile_worker(seconds, hz=DEFAULT_PROFILE_HZ, include_idle=False):
+    """
+    Profile every thread of this worker for `seconds` (capped) and return the speedscope document.
+    Blocks the calling thread, raises ProfilerBusy if a profile is already running.
+    """
+    seconds = max(0.1, min(seconds, MAX_PROFILE_SECONDS))
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("a profile is already running on this worker")
+    try:
+        logger.info("Profiling worker for %.1fs at %d Hz", seconds, hz)
+        profiler = SamplingProfiler(hz=hz, include_idle=include_idle).run(seconds)
+    finally:
+        _profile_lock.release()
+
+    logger.info("Profile done, %d samples", profiler.samples)
+    return profiler.to_speedscope(f"pid {os.getpid()} for {profiler.duration:.1f}s")
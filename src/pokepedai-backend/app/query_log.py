@@ -0,0 +1,87 @@
+"""
+Log of rewritten /chat queries, read by `python -m app.warm_cache` to find popular questions.
+
+Appends are synchronous, one short line per request. The file is rotated by size: once it passes
+QUERY_LOG_MAX_BYTES it is renamed to `<path>.1` (replacing the previous generation) and a new file
+is started, so disk use stays under twice the cap and top_queries() reads at most that much.
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from pathlib import Path
+
+from .retrieval_cache import normalize_query
+
+logger = logging.getLogger("pokepedia.query_log")
+
+BASE_DIR = Path(__file__).resolve().parent
+
+QUERY_LOG_ENABLED = os.getenv("QUERY_LOG_ENABLED", "true").lower() == "true"
+QUERY_LOG_PATH = Path(os.getenv("QUERY_LOG_PATH", BASE_DIR / "data" / "query_log.jsonl"))
+QUERY_LOG_MAX_BYTES = int(os.getenv("QUERY_LOG_MAX_BYTES", str(16 * 1024 * 1024)))
+
+
+def rotated_path(path):
+    return Path(f"{path}.1")
+
+
+class QueryLog:
+    def __init__(
+        self, path=QUERY_LOG_PATH, enabled=QUERY_LOG_ENABLED, max_bytes=QUERY_LOG_MAX_BYTES
+    ):
+        """
+        Append-only log of rewritten queries for cache warming, rotated past max_bytes.
+        Only the normalized query text is written: no client address, session id or raw user message.
+        """
+        self.path = Path(path)
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _rotate(self):
+        # another worker may have rotated the shared file already
+        if self.path.stat().st_size < self.max_bytes:
+            return
+        os.replace(self.path, rotated_path(self.path))
+        logger.info("Rotated query log %s", self.path)
+
+    def record(self, query):
+        if not self.enabled or not query:
+            return
+        line = json.dumps({"q": normalize_query(query)}, ensure_ascii=False)
+        try:
+            with self._lock:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+                    size = f.tell()
+                if self.max_bytes and size >= self.max_bytes:
+                    self._rotate()
+        except OSError:
+            # logging queries must never fail a request
+            logger.exception("Failed to append to query log %s", self.path)
+
+
+def top_queries(path=QUERY_LOG_PATH, n=100):
+    """
+    The n most frequent queries in a query log and its rotated generation, as (query, count) pairs.
+    """
+    counts = Counter()
+    for log_path in (rotated_path(path), Path(path)):
+        if not log_path.exists():
+            continue
+        with open(log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    counts[json.loads(line)["q"]] += 1
+                except (json.JSONDecodeError, KeyError):
+                    continue
+    return counts.most_common(n)
+
+
+query_log = QueryLog()
@@ -0,0 +1,173 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from .metrics import metrics
+from .profiling import SamplingProfiler
+
+logger = logging.getLogger("pokepedia.request_trace")
+
+# requests slower than this are kept with their stage timings and a profile, 0 disables capture
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "10"))
+SLOW_REQUEST_BUFFER = int(os.getenv("SLOW_REQUEST_BUFFER", "20"))
+# profile the threads working for a request once it passes the threshold
+SLOW_REQUEST_PROFILE = os.getenv("SLOW_REQUEST_PROFILE", "true").lower() == "true"
+SLOW_REQUEST_PROFILE_HZ = int(os.getenv("SLOW_REQUEST_PROFILE_HZ", "200"))
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class RequestTrace:
+    def __init__(self, path, profile=None):
+        """
+        Per-request stage timings, filled in by trace_stage() wherever the request's context is active.
+        """
+        self.path = path
+        self.profile = profile
+        self.started_at = time.time()
+        self.start = time.monotonic()
+        self.stages = []
+        # threads currently working for this request: the pipeline thread plus executor threads
+        self.thread_ids = set()
+        self.status = None
+        self.profiler = None
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.stages.append(
+                {
+                    "stage": stage,
+                    # offset of the stage's start from the request start
+                    "at": round(self.elapsed() - seconds, 4),
+                    "seconds": round(seconds, 4),
+                }
+            )
+
+    def breakdown(self):
+        """
+        Total seconds per stage name.
+        """
+        totals = {}
+        with self._lock:
+            for entry in self.stages:
+                totals[entry["stage"]] = totals.get(entry["stage"], 0.0) + entry["seconds"]
+        return {stage: round(seconds, 4) for stage, seconds in totals.items()}
+
+    def watch(self):
+        """
+        Called periodically while the request runs: once it is past the slow threshold,
+        start sampling the threads working for it (pipeline, embedding / FAISS, answer stream).
+        """
+        if (
+            not SLOW_REQUEST_PROFILE
+            or not SLOW_REQUEST_SECONDS
+            or self.profiler is not None
+            or not self.thread_ids
+            or self.elapsed() < SLOW_REQUEST_SECONDS
+        ):
+            return
+        logger.info("Request on %s passed %.1fs, profiling it", self.path, SLOW_REQUEST_SECONDS)
+        # the live set, executor threads that pick up work later are sampled too
+        self.profiler = SamplingProfiler(
+            hz=SLOW_REQUEST_PROFILE_HZ, thread_ids=self.thread_ids
+        ).start()
+
+    def finish(self, status):
+        """
+        Stop profiling and keep the trace if the request was slow.
+        """
+        self.status = status
+        if self.profiler is not None:
+            self.profiler.stop()
+        if SLOW_REQUEST_SECONDS and self.elapsed() >= SLOW_REQUEST_SECONDS:
+            slow_requests.add(self)
+
+    def to_dict(self):
+        return {
+            "path": self.path,
+            "profile": self.profile,
+            "status": self.status,
+            "started_at": self.started_at,
+            "seconds": round(self.elapsed(), 4),
+            "breakdown": self.breakdown(),
+            "stages": list(self.stages),
+            "speedscope": (
+                self.profiler.to_speedscope(f"{self.path} after {SLOW_REQUEST_SECONDS:.0f}s")
+                if self.profiler is not None
+                else None
+            ),
+        }
+
+
+class SlowRequestBuffer:
+    def __init__(self, max_entries=SLOW_REQUEST_BUFFER):
+        """
+        Ring buffer of the most recent slow request traces.
+        """
+        self._entries = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+
+    def add(self, trace):
+        entry = trace.to_dict()
+        with self._lock:
+            self._entries.append(entry)
+        metrics.incr("slow_requests.captured")
+        logger.warning(
+            "Slow request on %s took %.2fs: %s", trace.path, entry["seconds"], entry["breakdown"]
+        )
+
+    def entries(self):
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+slow_requests = SlowRequestBuffer()
+
+
+def trace_stage(stage, seconds):
+    """
+    Add a stage timing to the current request's trace, a no-op outside a traced request.
+    """
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+
+@contextmanager
+def traced_thread():
+    """
+    Mark the current thread as working for the current request while the block runs,
+    so a slow-request profile samples executor threads and not just the waiting pipeline thread.
+    """
+    trace = current_trace.get()
+    ident = threading.get_ident()
+    # a thread already working for the request (the pipeline thread) stays registered
+    added = trace is not None and ident not in trace.thread_ids
+    if added:
+        trace.thread_ids.add(ident)
+    try:
+        yield
+    finally:
+        if added:
+            trace.thread_ids.discard(ident)
+
+
+@contextmanager
+def stage_timer(stage):
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        trace_stage(stage, time.monotonic() - start)
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from .metrics import metrics
+
+logger = logging.getLogger("pokepedia.retrieval_cache")
+
+BASE_DIR = Path(__file__).resolve().parent
+PROMPTS_PATH = BASE_DIR / "chatbot_utils" / "prompt_provider.py"
+
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "2048"))
+WARM_SNAPSHOT_PATH = Path(
+    os.getenv("WARM_SNAPSHOT_PATH", BASE_DIR / "data" / "warm_snapshot.json")
+)
+
+
+def normalize_query(query):
+    """
+    Case and whitespace insensitive cache key for a query.
+    """
+    return re.sub(r"\s+", " ", (query or "").strip().lower())
+
+
+def prompt_version():
+    """
+    Hash of the prompt templates, cached answers are only valid for the prompts that produced them.
+    """
+    with open(PROMPTS_PATH, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+PROMPT_VERSION = prompt_version()
+
+
+class LRUCache:
+    def __init__(self, max_entries, name):
+        """
+        Thread safe LRU cache, hits and misses are counted in metrics under `name`.
+        """
+        self.max_entries = max_entries
+        self.name = name
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                metrics.incr(f"cache.{self.name}.misses")
+                return None
+            self._entries.move_to_end(key)
+            metrics.incr(f"cache.{self.name}.hits")
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class RetrievalCache:
+    def __init__(self, max_entries=RETRIEVAL_CACHE_SIZE):
+        """
+        Query vectors, search hits and precomputed answers for one index + prompt version.
+        Everything is dropped when the version changes (index reload or new prompts). Hits are
+        also keyed by index version: a search still running on the old index after a reload
+        must not serve its ids against the new one.
+        """
+        self.vectors = LRUCache(max_entries, "vectors")
+        self.hits = LRUCache(max_entries, "hits")
+        self.answers = LRUCache(max_entries, "answers")
+        self.version = None
+        self._lock = threading.Lock()
+
+    def ensure_version(self, index_version):
+        """
+        Bind the cache to an index version, clearing it if it was built for another one.
+        """
+        version = f"{index_version}:{PROMPT_VERSION}"
+        if version == self.version:
+            return
+        with self._lock:
+            if version != self.version:
+                if self.version is not None:
+                    logger.info("Cache version changed %s -> %s, clearing", self.version, version)
+                self.vectors.clear()
+                self.hits.clear()
+                self.answers.clear()
+                self.version = version
+
+    @staticmethod
+    def hits_key(index_version, query, top_k, pokemon=None, sections=None):
+        return (index_version, normalize_query(query), top_k, pokemon, tuple(sections or ()))
+
+    @staticmethod
+    def answer_key(query, profile_name):
+        return (normalize_query(query), profile_name)
+
+    def load_snapshot(self, path, index_version):
+        """
+        Load a snapshot written by `python -m app.warm_cache`. Returns the number of queries loaded,
+        0 if the snapshot is missing or was built for another index / prompt version.
+        """
+        # bind to the new index even without a snapshot, so a reload still clears the cache
+        self.ensure_version(index_version)
+
+        path = Path(path)
+        if not path.exists():
+            logger.info("No warm snapshot at %s, starting cold", path)
+            return 0
+
+        with open(path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+
+        if snapshot.get("version") != self.version:
+            metrics.incr("cache.snapshot.stale")
+            logger.warning(
+                "Ignoring stale warm snapshot %s (built for %s, serving %s)",
+                path,
+                snapshot.get("version"),
+                self.version,
+            )
+            return 0
+
+        for entry in snapshot["entries"]:
+            query = entry["query"]
+            self.vectors.put(normalize_query(query), np.asarray([entry["vector"]], dtype="float32"))
+            for hit in entry["hits"]:
+                key = self.hits_key(
+                    index_version, query, hit["top_k"], hit.get("pokemon"), hit.get("sections")
+                )
+                self.hits.put(
+                    key,
+                    (
+                        np.asarray([hit["distances"]], dtype="float32"),
+                        np.asarray([hit["ids"]], dtype="int64"),
+                    ),
+                )
+            if entry.get("answer"):
+                self.answers.put(
+                    self.answer_key(query, entry["profile"]),
+                    {"context": entry.get("context", ""), "answer": entry["answer"]},
+                )
+
+        logger.info("Loaded warm snapshot %s with %d queries", path, len(snapshot["entries"]))
+        return len(snapshot["entries"])
+
+
+retrieval_cache = RetrievalCache()
@@ -0,0 +1,119 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from .chatbot_utils.utils import trim_history
+
+logger = logging.getLogger("pokepedia.session_store")
+
+DEFAULT_SESSION_TTL = int(os.getenv("SESSION_TTL_SECONDS", "1800"))
+DEFAULT_MAX_SESSIONS = int(os.getenv("SESSION_MAX_ENTRIES", "1000"))
+
+
+class ChatSessionState:
+    def __init__(self, session_id):
+        """
+        Server side state for one conversation: trimmed history plus what the last turn retrieved.
+        """
+        self.session_id = session_id
+        self.history: List[Dict[str, str]] = []
+        self.last_rewritten_query: Optional[str] = None
+        self.last_results: List[Dict] = []
+        # index version last_results were retrieved from, their ids mean nothing in another one
+        self.last_results_version: Optional[str] = None
+        self.last_access = time.time()
+        # turns of one session can run concurrently (double submit, several tabs)
+        self._lock = threading.Lock()
+
+    def snapshot(self, index_version=None):
+        """
+        Copies of (history, last rewritten query, last results) for the next turn to start from.
+        With `index_version`, last results retrieved from another index are left out.
+        """
+        with self._lock:
+            results = self.last_results
+            if index_version is not None and self.last_results_version != index_version:
+                results = []
+            return list(self.history), self.last_rewritten_query, list(results)
+
+    def record_turn(self, message, reply, rewritten_query, results, index_version=None):
+        """
+        Append the finished turn and keep the retrieval state for the next follow up.
+        """
+        with self._lock:
+            history = self.history + [
+                {"role": "user", "message": message},
+                {"role": "assistant", "message": reply},
+            ]
+            self.history = trim_history(history)
+
+            if rewritten_query:
+                self.last_rewritten_query = rewritten_query
+            if results:
+                self.last_results = results
+                self.last_results_version = index_version
+
+
+class SessionStore:
+    def __init__(self, ttl_seconds=DEFAULT_SESSION_TTL, max_sessions=DEFAULT_MAX_SESSIONS):
+        """
+        Bounded in-memory session store, least recently used sessions are evicted first
+        and sessions idle longer than ttl_seconds are dropped.
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, ChatSessionState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, session_id=None):
+        """
+        Return the session for session_id, creating a fresh one if it is unknown or expired.
+        Only ids issued by this store are resolved, a new session always gets a server generated id
+        so clients can't pick (or guess into) each other's sessions.
+        """
+        now = time.time()
+
+        with self._lock:
+            self._evict_expired(now)
+
+            if session_id and session_id in self._sessions:
+                session = self._sessions[session_id]
+                session.last_access = now
+                self._sessions.move_to_end(session_id)
+                return session
+
+            if session_id:
+                logger.info("Unknown or expired session id, issuing a new session")
+            session_id = uuid.uuid4().hex
+            session = ChatSessionState(session_id)
+            self._sessions[session_id] = session
+
+            # enforce size bound
+            while len(self._sessions) > self.max_sessions:
+                evicted_id, _ = self._sessions.popitem(last=False)
+                logger.debug("Evicted session %s (store full)", evicted_id)
+
+            logger.info("Created session %s (%d active)", session_id, len(self._sessions))
+            return session
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def _evict_expired(self, now):
+        """
+        Drop sessions idle past the ttl, oldest are at the front so stop at the first live one.
+        """
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_access <= self.ttl_seconds:
+                break
+            self._sessions.popitem(last=False)
+            logger.debug("Evicted session %s (expired)", session_id)
+
+
+session_store = SessionStore()
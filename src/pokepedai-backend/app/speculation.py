@@ -0,0 +1,128 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import metrics
+from .request_trace import traced_thread
+
+logger = logging.getLogger("pokepedia.speculation")
+
+# speculative answer streams in flight per worker, extra requests wait for a slot
+SPECULATION_MAX_CONCURRENCY = int(os.getenv("SPECULATION_MAX_CONCURRENCY", "8"))
+# rough chars per token, for the prompt tokens of a stream cancelled before its usage arrived
+CHARS_PER_TOKEN = 4
+
+speculation_executor = ThreadPoolExecutor(
+    max_workers=SPECULATION_MAX_CONCURRENCY, thread_name_prefix="speculate"
+)
+
+
+class SpeculativeAnswer:
+    def __init__(self, llm, executor=speculation_executor):
+        """
+        One request's answer generated ahead of time, overlapped with the first sufficiency check.
+        The answer is only used if the final query and context are exactly what it was started from.
+        """
+        self.llm = llm
+        self.executor = executor
+        self.key = None
+        self.prompt = None
+        self.future = None
+        self.started_at = None
+        self._cancel = threading.Event()
+
+    @property
+    def started(self):
+        return self.future is not None
+
+    def start(self, query, context, prompt, model, deadline=None):
+        """
+        Start streaming the answer for (query, context) in the background.
+        """
+        if self.started:
+            return
+        self.key = (query, context)
+        self.prompt = prompt
+        self.started_at = time.monotonic()
+        # run in the request's context so the stream shows up in its trace
+        self.future = self.executor.submit(
+            contextvars.copy_context().run,
+            self._stream,
+            prompt,
+            model,
+            deadline,
+        )
+        metrics.incr("speculation.started")
+        logger.info("[STEP] speculative_answer_start | query='%s'", query)
+
+    def _stream(self, prompt, model, deadline):
+        # registered with the request so a slow-request profile samples the stream
+        with traced_thread():
+            return self.llm.stream(
+                "answer", prompt, model=model, deadline=deadline, cancel=self._cancel
+            )
+
+    def take(self, query, context):
+        """
+        The speculative answer if it was started for this query and context and finished,
+        otherwise None (it is cancelled) and the caller generates the answer itself.
+        Each speculation's outcome is recorded once, a cancelled one is already counted.
+        """
+        if not self.started or self._cancel.is_set():
+            return None
+        if self.key != (query, context):
+            self.cancel()
+            return None
+
+        try:
+            result = self.future.result()
+        except Exception:
+            logger.exception("Speculative answer failed, generating it again")
+            metrics.incr("speculation.errors")
+            self._record_outcome(hit=False)
+            return None
+
+        if not result["completed"] or not result["text"]:
+            self._record_waste(result)
+            self._record_outcome(hit=False)
+            return None
+
+        metrics.observe("speculation.lead.seconds", time.monotonic() - self.started_at)
+        self._record_outcome(hit=True)
+        logger.info("[STEP] speculative_answer_used | query='%s'", query)
+        return result["text"]
+
+    def cancel(self):
+        """
+        Drop the speculative answer (another loop will run or the request failed), stopping its stream.
+        """
+        if not self.started or self._cancel.is_set():
+            return
+        self._cancel.set()
+        self._record_outcome(hit=False)
+        logger.info("[STEP] speculative_answer_cancelled | query='%s'", self.key[0])
+        if self.future.cancel():
+            # still queued for an executor slot, nothing was sent
+            return
+        # the stream thread notices the event on its next token, account for what it used then
+        self.future.add_done_callback(self._done_after_cancel)
+
+    def _done_after_cancel(self, future):
+        if future.exception() is None:
+            self._record_waste(future.result())
+
+    def _record_waste(self, result):
+        input_tokens = result["input_tokens"]
+        if input_tokens is None:
+            input_tokens = len(self.prompt) // CHARS_PER_TOKEN
+        metrics.incr("speculation.wasted_input_tokens", input_tokens)
+        metrics.incr("speculation.wasted_output_tokens", result["output_tokens"])
+
+    def _record_outcome(self, hit):
+        self._cancel.set()
+        metrics.incr("speculation.hits" if hit else "speculation.misses")
+        resolved = metrics.counter("speculation.hits") + metrics.counter("speculation.misses")
+        metrics.set_gauge("speculation.hit_rate", metrics.counter("speculation.hits") / resolved)
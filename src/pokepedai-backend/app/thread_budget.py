@@ -0,0 +1,86 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("pokepedia.thread_budget")
+
+# uvicorn reads the same variable for its worker count
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# threads one embedding / FAISS call may use, 1 suits single short queries best
+OP_THREADS = int(os.getenv("OP_THREADS", "1"))
+
+
+def available_cpus():
+    """
+    Cores this process may run on, respecting container / taskset limits.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def cpu_budget_per_worker(cpus=None, workers=WEB_CONCURRENCY):
+    """
+    Cores each uvicorn worker may use, overridable with CPU_BUDGET_PER_WORKER.
+    """
+    override = os.getenv("CPU_BUDGET_PER_WORKER")
+    if override:
+        return max(1, int(override))
+    cpus = cpus or available_cpus()
+    return max(1, cpus // max(workers, 1))
+
+
+def search_concurrency(budget=None, op_threads=OP_THREADS):
+    """
+    Concurrent dense_search calls per worker so that calls x threads fits the worker's budget.
+    """
+    override = os.getenv("SEARCH_CONCURRENCY")
+    if override:
+        return max(1, int(override))
+    budget = budget or cpu_budget_per_worker()
+    return max(1, budget // max(op_threads, 1))
+
+
+def apply_thread_env(op_threads=OP_THREADS):
+    """
+    Set thread env vars for OpenMP/MKL/tokenizers. Must run before torch or faiss are imported,
+    values already set in the environment win.
+    """
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ.setdefault(var, str(op_threads))
+    # the tokenizers' own pool would oversubscribe on top of ours
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+
+def apply_runtime_threads(op_threads=OP_THREADS):
+    """
+    Cap torch intra-op and FAISS OpenMP threads after they are imported.
+    """
+    import faiss
+    import torch
+
+    torch.set_num_threads(op_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # can only be set before torch starts parallel work
+        pass
+    faiss.omp_set_num_threads(op_threads)
+
+
+def make_search_executor():
+    """
+    Per-worker executor that bounds concurrent embedding + FAISS calls.
+    """
+    budget = cpu_budget_per_worker()
+    slots = search_concurrency(budget)
+    logger.info(
+        "Thread budget: %d cpus, %d workers, %d cores/worker, %d search slots x %d threads",
+        available_cpus(),
+        WEB_CONCURRENCY,
+        budget,
+        slots,
+        OP_THREADS,
+    )
+    return ThreadPoolExecutor(max_workers=slots, thread_name_prefix="dense-search")
@@ -0,0 +1,117 @@
+"""
+Mine the query log for popular questions and precompute a cache-warming snapshot.
+
+    python -m app.warm_cache --top 200 [--answers]
+
+For the top-N rewritten queries this stores the query vector, the FAISS hits (for every
+profile's search size, see fetch_k_for) and the context built the way RCR builds it; with
+--answers it also runs the full RCR pipeline and stores the final answer. New workers load the
+snapshot at startup, before reporting ready. The snapshot is tagged with the index and prompt
+versions, so a snapshot built for another index or other prompts is ignored.
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+
+from . import chatbot_logic
+from .chatbot_utils.utils import build_context
+from .profiles import profiles, resolve_profile
+from .query_log import QUERY_LOG_PATH, top_queries
+from .retrieval_cache import PROMPT_VERSION, WARM_SNAPSHOT_PATH, retrieval_cache
+
+logger = logging.getLogger("pokepedia.warm_cache")
+
+
+def precompute_entry(query, count, profile, with_answer):
+    store = chatbot_logic.index_store
+    q_vec = chatbot_logic.encode_query(query)
+    filters = chatbot_logic.infer_search_filters(query, store)
+    ids = store.filter_ids(filters.get("pokemon"), filters.get("sections"))
+
+    hits = []
+    for top_k in sorted({chatbot_logic.fetch_k_for(p) for p in profiles.values()}):
+        D, I = chatbot_logic.encode_and_search(store, query, top_k, ids)
+        hits.append(
+            {
+                "top_k": top_k,
+                "pokemon": filters.get("pokemon"),
+                "sections": filters.get("sections"),
+                "distances": D[0].tolist(),
+                "ids": I[0].tolist(),
+            }
+        )
+
+    results = chatbot_logic.dense_search(
+        query, top_k=chatbot_logic.fetch_k_for(profile), store=store, **filters
+    )
+    results = chatbot_logic.select_context_results(store, results, query, profile)
+    context = build_context(results, profile.max_context_chars)
+
+    entry = {
+        "query": query,
+        "count": count,
+        "profile": profile.name,
+        "vector": q_vec[0].tolist(),
+        "hits": hits,
+        "context": context,
+    }
+
+    if with_answer:
+        final_query, results = chatbot_logic.recursive_dense_retrieval(
+            query=query, profile=profile, store=store
+        )
+        entry["context"] = build_context(results, profile.max_context_chars)
+        entry["answer"] = chatbot_logic.answer(
+            entry["context"], final_query, model=profile.model_for("answer")
+        )
+
+    return entry
+
+
+def build_snapshot(log_path, top_n, profile, with_answer):
+    store = chatbot_logic.index_store
+    retrieval_cache.ensure_version(store.version)
+
+    entries = []
+    for query, count in top_queries(log_path, top_n):
+        try:
+            entries.append(precompute_entry(query, count, profile, with_answer))
+        except Exception:
+            logger.exception("Skipping query '%s'", query)
+
+    return {
+        "version": retrieval_cache.version,
+        "index_version": store.version,
+        "prompt_version": PROMPT_VERSION,
+        "created_at": int(time.time()),
+        "entries": entries,
+    }
+
+
+def main(argv=None):
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+    )
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--log", default=str(QUERY_LOG_PATH))
+    parser.add_argument("--out", default=str(WARM_SNAPSHOT_PATH))
+    parser.add_argument("--top", type=int, default=200)
+    parser.add_argument("--profile", default=None, help="profile used for contexts and answers")
+    parser.add_argument("--answers", action="store_true", help="also precompute final answers")
+    args = parser.parse_args(argv)
+
+    snapshot = build_snapshot(args.log, args.top, resolve_profile(args.profile), args.answers)
+
+    tmp = f"{args.out}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    os.replace(tmp, args.out)
+    logger.info("Wrote %d entries to %s", len(snapshot["entries"]), args.out)
+
+
+if __name__ == "__main__":
+    main()
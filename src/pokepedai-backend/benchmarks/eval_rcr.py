@@ -0,0 +1,308 @@
+"""
+Offline retrieval quality vs. latency evaluation of the RCR loop.
+
+    python -m benchmarks.eval_rcr --questions questions.jsonl --profiles fast balanced thorough
+    python -m benchmarks.eval_rcr --questions questions.jsonl --llm record --recording rec.json
+    python -m benchmarks.eval_rcr --questions questions.jsonl --llm replay --recording rec.json \
+        --configs configs.json --out report.json
+
+Runs the answer pipeline (rewrite when the profile has it, `recursive_dense_retrieval`, answer)
+over a labeled question set against the real index and reports, per configuration: recall@k after
+each loop (questions that stopped earlier keep their last context), final recall@k, loops run, the
+loop the judge said YES on, LLM calls per question and end-to-end latency, both including the
+rewrite and answer calls. The rewrite sees no history, and a speculative answer is not simulated:
+the answer counts once, after retrieval. Configurations are pipeline profiles, by name or from a
+json file in the PIPELINE_PROFILES_PATH format, and are printed side by side.
+
+The LLM is never called except in `--llm record` mode:
+  stub    scripted answers: sufficiency says NO while the question still has `refinements` left,
+          refinement returns the next one. Without refinements every question stops after loop 1.
+          Simulated LLM latency comes from the deadline module's stage estimates.
+  record  real LLM calls, responses and latencies saved to --recording for later replays.
+  replay  recorded responses keyed by stage + prompt, with the recorded latency. Prompts that were
+          not recorded (a config changed the context) fall back to the stub and are counted.
+
+Question file (JSONL): {"question": ..., "gold_ids": [...], "refinements": [...]}. `gold_ids` are
+metadata chunk ids; chunks split by the ingest tool (`<id>#<n>`) count for their parent id.
+benchmarks/eval_questions.example.jsonl shows the format, its gold ids are illustrative only.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+STUB_REPLIES = {
+    "rewrite": lambda state, prompt: state["question"],
+    "decompose": lambda state, prompt: f"QUERY: {state['question']}",
+}
+
+
+def load_questions(path):
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            item.setdefault("refinements", [])
+            questions.append(item)
+    return questions
+
+
+def prompt_key(stage, model, prompt):
+    digest = hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()[:24]
+    return f"{stage}:{digest}"
+
+
+class ReplayLLM:
+    def __init__(self, mode, recording_path=None, real_llm=None):
+        """
+        Drop-in for chatbot_logic.llm: same complete() signature, answers from a recording or a
+        script instead of the API, and logs every call of the current question.
+        """
+        from app.deadline import DEFAULT_STAGE_ESTIMATES
+
+        self.mode = mode
+        self.recording_path = recording_path
+        self.real_llm = real_llm
+        self.stage_estimates = DEFAULT_STAGE_ESTIMATES
+        self.recording = {}
+        if mode == "replay" or (mode == "record" and recording_path and os.path.exists(recording_path)):
+            with open(recording_path, "r", encoding="utf-8") as f:
+                self.recording = json.load(f)
+        self.replay_misses = 0
+        self.begin({"question": "", "refinements": []})
+
+    def begin(self, question):
+        self.state = {
+            "question": question["question"],
+            "refinements": list(question["refinements"]),
+        }
+        self.calls = []
+
+    def stub(self, stage, prompt):
+        if stage in STUB_REPLIES:
+            return STUB_REPLIES[stage](self.state, prompt)
+        if stage == "sufficiency":
+            return "NO" if self.state["refinements"] else "YES"
+        if stage == "refinement":
+            if self.state["refinements"]:
+                return f"QUERY: {self.state['refinements'].pop(0)}"
+            # unchanged query, RCR stops
+            return f"QUERY: {self.state['question']}"
+        return ""
+
+    def complete(self, stage, prompt, model=None, timeout=None, deadline=None):
+        key = prompt_key(stage, model, prompt)
+
+        if self.mode == "record":
+            start = time.monotonic()
+            text = self.real_llm.complete(stage, prompt, model=model, timeout=timeout)
+            seconds = time.monotonic() - start
+            self.recording[key] = {"text": text, "seconds": seconds}
+            # real latency is already in the wall clock
+            self.calls.append((stage, text, 0.0))
+            return text
+
+        recorded = self.recording.get(key) if self.mode == "replay" else None
+        if recorded is not None:
+            text, seconds = recorded["text"], recorded["seconds"]
+        else:
+            if self.mode == "replay":
+                self.replay_misses += 1
+            text = self.stub(stage, prompt)
+            seconds = self.stage_estimates.get(f"llm.{stage}", 0.0)
+
+        self.calls.append((stage, text, seconds))
+        return text
+
+    def save(self):
+        if self.mode != "record" or not self.recording_path:
+            return
+        tmp = f"{self.recording_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.recording, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.recording_path)
+
+
+def parent_id(chunk_id):
+    return str(chunk_id).split("#", 1)[0]
+
+
+def recall_at_k(results, gold_ids, k):
+    if not gold_ids:
+        return None
+    found = {parent_id(r["doc"].get("id", "")) for r in results[:k]}
+    return len(found & gold_ids) / len(gold_ids)
+
+
+def evaluate_question(logic, llm, question, profile):
+    llm.begin(question)
+    gold_ids = {parent_id(g) for g in question.get("gold_ids", [])}
+    per_loop = []
+
+    def on_loop(loop, query, results):
+        per_loop.append(recall_at_k(results, gold_ids, profile.k))
+
+    start = time.monotonic()
+    query = question["question"]
+    if profile.rewrite:
+        query = logic.rewrite_query_with_history(
+            query=query, history=[], model=profile.model_for("rewrite")
+        )
+    final_query, results = logic.recursive_dense_retrieval(
+        query=query, profile=profile, on_loop=on_loop
+    )
+    logic.answer(
+        logic.build_context(results, profile.max_context_chars),
+        final_query,
+        model=profile.model_for("answer"),
+    )
+    wall = time.monotonic() - start
+
+    verdicts = [text.upper().startswith("YES") for stage, text, _ in llm.calls if stage == "sufficiency"]
+    return {
+        "per_loop": per_loop,
+        "final_recall": recall_at_k(results, gold_ids, profile.k),
+        "loops": len(per_loop),
+        "sufficient_at": verdicts.index(True) + 1 if True in verdicts else None,
+        "llm_calls": Counter(stage for stage, _, _ in llm.calls),
+        "seconds": wall + sum(seconds for _, _, seconds in llm.calls),
+    }
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def mean(values):
+    values = [v for v in values if v is not None]
+    return statistics.fmean(values) if values else None
+
+
+def summarize(rows, max_loops):
+    summary = {"questions": len(rows)}
+    for loop in range(1, max_loops + 1):
+        # a question that stopped earlier keeps the recall of its last context
+        summary[f"recall@k loop {loop}"] = mean(
+            [r["per_loop"][min(loop, len(r["per_loop"])) - 1] for r in rows if r["per_loop"]]
+        )
+    summary["recall@k final"] = mean([r["final_recall"] for r in rows])
+    summary["loops mean"] = mean([r["loops"] for r in rows])
+    sufficient = [r["sufficient_at"] for r in rows if r["sufficient_at"] is not None]
+    summary["sufficient (share)"] = len(sufficient) / len(rows) if rows else None
+    summary["loops to sufficiency"] = mean(sufficient)
+    calls = Counter()
+    for r in rows:
+        calls.update(r["llm_calls"])
+    summary["llm calls / question"] = sum(calls.values()) / len(rows) if rows else None
+    for stage in sorted(calls):
+        summary[f"  {stage}"] = calls[stage] / len(rows)
+    latencies = [r["seconds"] for r in rows]
+    summary["latency p50 (s)"] = percentile(latencies, 50) if latencies else None
+    summary["latency p95 (s)"] = percentile(latencies, 95) if latencies else None
+    return summary
+
+
+def load_configs(args):
+    from app.profiles import PipelineProfile, profiles
+
+    configs = {}
+    for name in args.profiles or []:
+        if name not in profiles:
+            raise SystemExit(f"Unknown profile '{name}', known: {', '.join(profiles)}")
+        configs[name] = profiles[name]
+    if args.configs:
+        with open(args.configs, "r", encoding="utf-8") as f:
+            for name, fields in json.load(f).items():
+                configs[name] = PipelineProfile(name=name, **fields).clamped()
+    return configs or {"balanced": profiles["balanced"]}
+
+
+def print_table(summaries):
+    names = list(summaries)
+    rows = []
+    for summary in summaries.values():
+        rows.extend(key for key in summary if key not in rows)
+
+    width = max(len(name) for name in names + ["metric"]) + 2
+    print(f"{'metric':<24}" + "".join(f"{name:>{width}}" for name in names))
+    for key in rows:
+        cells = []
+        for name in names:
+            value = summaries[name].get(key)
+            if value is None:
+                cells.append(f"{'-':>{width}}")
+            elif isinstance(value, float):
+                cells.append(f"{value:>{width}.3f}")
+            else:
+                cells.append(f"{value:>{width}}")
+        print(f"{key:<24}" + "".join(cells))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--questions", required=True, help="labeled question JSONL")
+    parser.add_argument("--profiles", nargs="+", help="built-in / configured profile names")
+    parser.add_argument("--configs", help="json file of {name: profile fields} to compare")
+    parser.add_argument("--llm", choices=["stub", "record", "replay"], default="stub")
+    parser.add_argument("--recording", help="recorded LLM responses for record / replay")
+    parser.add_argument("--out", help="write the summaries and per-question rows as json")
+    args = parser.parse_args(argv)
+
+    if args.llm != "stub" and not args.recording:
+        parser.error("--recording is required with --llm record / replay")
+    if args.llm != "record":
+        # nothing reaches the API outside record mode
+        os.environ.setdefault("OPENAI_API_KEY", "eval-unused")
+    os.environ["QUERY_LOG_ENABLED"] = "false"
+
+    from app import chatbot_logic
+    from app.retrieval_cache import retrieval_cache
+
+    questions = load_questions(args.questions)
+    configs = load_configs(args)
+    llm = ReplayLLM(args.llm, args.recording, real_llm=chatbot_logic.llm)
+    chatbot_logic.llm = llm
+
+    # load the embedding model before anything is timed
+    chatbot_logic.encode_query("warm up")
+
+    summaries = {}
+    report = {}
+    for name, profile in configs.items():
+        # every config starts cold, cached vectors / hits from the previous one would skew latency
+        retrieval_cache.vectors.clear()
+        retrieval_cache.hits.clear()
+
+        rows = []
+        for question in questions:
+            row = evaluate_question(chatbot_logic, llm, question, profile)
+            row["question"] = question["question"]
+            rows.append(row)
+
+        summaries[name] = summarize(rows, profile.max_loops)
+        report[name] = {"profile": profile.model_dump(), "summary": summaries[name], "rows": rows}
+
+    llm.save()
+    print_table(summaries)
+    if args.llm == "replay":
+        print(f"replay misses (served by the stub): {llm.replay_misses}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
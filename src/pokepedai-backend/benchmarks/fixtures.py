@@ -0,0 +1,136 @@
+"""
+Synthetic corpus, index and request fixtures for the benchmarks.
+
+Nothing here needs the LFS index data or a real OpenAI key: a random FAISS index and matching
+metadata are written to a temp directory and the backend is pointed at them through its
+INDEX_PATH / META_PATH settings before it is imported. No benchmark calls the LLM.
+"""
+
+import hashlib
+import json
+import os
+import random
+import tempfile
+from pathlib import Path
+
+SECTIONS = [
+    "description",
+    "core",
+    "abilities",
+    "training",
+    "breeding",
+    "statistics",
+    "evolutions",
+    "moves",
+    "locations",
+    "moves-by-generation",
+]
+WORDS = (
+    "grass poison fire water level learns move type weak strong route found evolves "
+    "ability stat attack defense speed pp power accuracy generation red blue gold"
+).split()
+EMBED_DIM = 384
+
+
+def synthetic_corpus(n_chunks, n_pokemon=150, seed=0):
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(n_chunks):
+        corpus.append(
+            {
+                "id": f"chunk-{i}",
+                "pokemon": f"Pokemon{i % n_pokemon}",
+                "section": SECTIONS[i % len(SECTIONS)],
+                "text": " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 160))),
+                "metadata": {},
+            }
+        )
+    return corpus
+
+
+def write_synthetic_index(directory, n_chunks, dim=EMBED_DIM, seed=0):
+    import faiss
+    import numpy as np
+
+    directory = Path(directory)
+    rng = np.random.default_rng(seed)
+    index = faiss.IndexFlatL2(dim)
+    index.add(rng.standard_normal((n_chunks, dim)).astype("float32"))
+
+    index_path = directory / "bench_faiss.index"
+    meta_path = directory / "bench_metadata.json"
+    faiss.write_index(index, str(index_path))
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(synthetic_corpus(n_chunks, seed=seed), f)
+    return index_path, meta_path
+
+
+class HashEncoder:
+    """
+    Deterministic stand-in for the SentenceTransformer, used with --synthetic-encoder so the
+    rest of dense_search can be measured without downloading the model.
+    """
+
+    def __init__(self, dim=EMBED_DIM):
+        self.dim = dim
+
+    def encode(self, texts, convert_to_tensor=False, **kwargs):
+        import numpy as np
+
+        rows = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            rows.append(np.random.default_rng(seed).standard_normal(self.dim))
+        return np.asarray(rows, dtype="float32")
+
+
+def load_backend(n_chunks, synthetic_encoder=False):
+    """
+    Import the backend against a synthetic index and return the chatbot_logic module.
+    """
+    workdir = Path(tempfile.mkdtemp(prefix="pokepedia-bench-"))
+    index_path, meta_path = write_synthetic_index(workdir, n_chunks)
+
+    os.environ["INDEX_PATH"] = str(index_path)
+    os.environ["META_PATH"] = str(meta_path)
+    os.environ["WARM_SNAPSHOT_PATH"] = str(workdir / "warm_snapshot.json")
+    os.environ["QUERY_LOG_ENABLED"] = "false"
+    # the client is constructed at import but never called by a benchmark
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark-unused")
+
+    from app import chatbot_logic
+
+    if synthetic_encoder:
+        chatbot_logic.embed_model = HashEncoder()
+    return chatbot_logic
+
+
+def make_history(n_messages, seed=0):
+    rng = random.Random(seed)
+    history = []
+    for i in range(n_messages):
+        history.append(
+            {
+                "role": "user" if i % 2 == 0 else "assistant",
+                "message": " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 80))),
+            }
+        )
+    return history
+
+
+class FakeRequest:
+    """
+    Just enough of a Starlette request for RateLimiter.__call__.
+    """
+
+    class _Client:
+        def __init__(self, host):
+            self.host = host
+
+    class _URL:
+        def __init__(self, path):
+            self.path = path
+
+    def __init__(self, host, path="/chat"):
+        self.client = self._Client(host)
+        self.url = self._URL(path)
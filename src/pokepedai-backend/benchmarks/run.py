@@ -0,0 +1,241 @@
+"""
+Micro-benchmarks for the retrieval and request-path hot spots, with regression gates.
+
+    python -m benchmarks.run                      # run, compare against baselines.json
+    python -m benchmarks.run --update-baseline    # run and store the results as the new baseline
+    python -m benchmarks.run --only dense_search build_context
+
+Each benchmark reports ops/sec, the peak memory allocated during one call (tracemalloc) and the
+net memory blocks left behind per call. A benchmark regresses when its ops/sec drops, or its peak
+allocation grows, by more than --threshold relative to the stored baseline; any regression makes
+the run exit with status 1. Baselines are only comparable on the same machine and settings.
+Backend logging runs at --log-level (WARNING by default) so the numbers measure the code, not
+the log handlers; the level is part of the recorded settings.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.fixtures import FakeRequest, load_backend, make_history  # noqa: E402
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines.json"
+
+REFINE_TEXT = (
+    "Replaced \"first move\" with \"Tackle (Bulbasaur's level 1 move in Pokémon Red & Blue)\".\n"
+    "QUERY: What is the PP of Bulbasaur's move Tackle (Lv. 1) in Pokémon Red & Blue?"
+)
+
+
+def measure(fn, min_time, alloc_samples=20):
+    for _ in range(3):
+        fn()
+
+    iterations = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        iterations += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time and iterations >= 10:
+            break
+
+    peaks = []
+    tracemalloc.start()
+    blocks_before = sys.getallocatedblocks()
+    for _ in range(alloc_samples):
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - current)
+    net_blocks = (sys.getallocatedblocks() - blocks_before) / alloc_samples
+    tracemalloc.stop()
+
+    return {
+        "ops_per_sec": iterations / elapsed,
+        "alloc_peak_kib": statistics.median(peaks) / 1024,
+        "net_blocks": net_blocks,
+    }
+
+
+def build_benchmarks(logic, args):
+    from app import main as backend_main
+    from app import rate_limiter
+    from app.chatbot_utils import utils
+
+    # importing app.main configures DEBUG logging, which would otherwise dominate the cheap calls
+    logging.getLogger().setLevel(args.log_level)
+
+    benchmarks = {}
+
+    counter = {"n": 0}
+
+    def dense_search_uncached():
+        # a new query every call: encode + search + result dicts, no cache hits
+        counter["n"] += 1
+        logic.dense_search(f"What moves does Pokemon{counter['n'] % 150} learn {counter['n']}", top_k=8)
+
+    benchmarks["dense_search"] = dense_search_uncached
+    benchmarks["dense_search_cached"] = lambda: logic.dense_search(
+        "What moves does Pokemon1 learn", top_k=8
+    )
+
+    results = logic.dense_search("Where can I catch Pokemon7", top_k=24)
+    benchmarks["build_context"] = lambda: utils.build_context(results)
+    benchmarks["mmr_diversify"] = lambda: logic.diversify(
+        logic.index_store, results, "Where can I catch Pokemon7", 3200, 0.7
+    )
+    benchmarks["infer_search_filters"] = lambda: logic.infer_search_filters(
+        "What level does Pokemon42 learn its moves"
+    )
+
+    history = make_history(200)
+    benchmarks["trim_format_history"] = lambda: utils.format_history(
+        utils.trim_history(history)
+    )
+    benchmarks["extract_search_query"] = lambda: utils.extract_search_query(REFINE_TEXT)
+
+    limiter = rate_limiter.RateLimiter(requests_limit=10, time_window=60)
+    requests = [FakeRequest(f"10.0.{i // 256}.{i % 256}") for i in range(args.clients)]
+    loop = asyncio.new_event_loop()
+    rate_counter = {"n": 0}
+
+    def rate_limiter_call():
+        rate_counter["n"] += 1
+        request = requests[rate_counter["n"] % len(requests)]
+        # keep every client under its limit so the benchmark never raises
+        rate_limiter.request_counters.pop(f"{request.client.host}:/chat", None)
+        loop.run_until_complete(limiter(request))
+
+    # fill the counter table so each call pays for a realistic number of tracked clients
+    for request in requests:
+        loop.run_until_complete(limiter(request))
+    benchmarks["rate_limiter_call"] = rate_limiter_call
+
+    payload = {"history": history[-8:], "message": "What type is Pokemon3?"}
+    benchmarks["chat_request_pydantic"] = lambda: [
+        m.model_dump() for m in backend_main.ChatRequest.model_validate(payload).history
+    ]
+
+    from fastapi.testclient import TestClient
+
+    # the endpoint without the RAG pipeline: routing, middleware, pydantic, admission, threadpool
+    backend_main.answer_with_rag = lambda **kwargs: "stub reply"
+    client = TestClient(backend_main.app)
+
+    def chat_endpoint():
+        rate_limiter.request_counters.clear()
+        response = client.post("/chat", json=payload)
+        assert response.status_code == 200, response.text
+
+    benchmarks["chat_endpoint_overhead"] = chat_endpoint
+
+    return benchmarks
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+            regressions.append(
+                f"{name}: {result['ops_per_sec']:.1f} ops/s vs baseline {base['ops_per_sec']:.1f}"
+            )
+        if base["alloc_peak_kib"] > 0 and result["alloc_peak_kib"] > base["alloc_peak_kib"] * (
+            1 + threshold
+        ):
+            regressions.append(
+                f"{name}: {result['alloc_peak_kib']:.1f} KiB peak/call vs baseline "
+                f"{base['alloc_peak_kib']:.1f}"
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", nargs="+", help="benchmark names to run")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds per benchmark")
+    parser.add_argument("--chunks", type=int, default=20000, help="synthetic corpus size")
+    parser.add_argument("--clients", type=int, default=10000, help="tracked rate limiter clients")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--synthetic-encoder", action="store_true", help="skip the real embedding model")
+    parser.add_argument(
+        "--log-level",
+        default="WARNING",
+        type=str.upper,
+        help="backend log level while benchmarking, DEBUG measures the request-path logging too",
+    )
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    logic = load_backend(args.chunks, synthetic_encoder=args.synthetic_encoder)
+    benchmarks = build_benchmarks(logic, args)
+    settings = {
+        "chunks": args.chunks,
+        "clients": args.clients,
+        "synthetic_encoder": args.synthetic_encoder,
+        "log_level": args.log_level,
+    }
+
+    results = {}
+    print(f"{'benchmark':<26} {'ops/sec':>12} {'peak KiB/call':>14} {'net blocks/call':>16}")
+    for name, fn in benchmarks.items():
+        if args.only and name not in args.only:
+            continue
+        result = measure(fn, args.min_time)
+        results[name] = result
+        print(
+            f"{name:<26} {result['ops_per_sec']:>12.1f} "
+            f"{result['alloc_peak_kib']:>14.1f} {result['net_blocks']:>16.1f}"
+        )
+
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        stored = {}
+        if baseline_path.exists():
+            with open(baseline_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored.get("settings") != settings:
+                stored = {}
+        stored["settings"] = settings
+        stored.setdefault("results", {}).update(results)
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {baseline_path}")
+        return 0
+
+    if not baseline_path.exists():
+        print("No baseline yet, run with --update-baseline to record one")
+        return 0
+
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        stored = json.load(f)
+    if stored.get("settings") != settings:
+        print(f"Baseline was recorded with {stored.get('settings')}, not comparing")
+        return 0
+
+    regressions = compare(results, stored["results"], args.threshold)
+    if regressions:
+        print("Regressions beyond threshold:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+
+    print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
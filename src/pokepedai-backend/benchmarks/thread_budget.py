@@ -0,0 +1,137 @@
+"""
+Throughput of embedding + FAISS search for different worker / thread combinations.
+
+    python -m benchmarks.thread_budget --workers 1 2 4 --op-threads 1 2 4 --clients 8
+
+Each combination starts `workers` processes (like uvicorn workers). Each process applies the
+same thread budget as the server and serves `clients` concurrent callers through its bounded
+search executor for `--seconds`. Uses a synthetic random index, so no LFS data or OpenAI key
+is needed; the embedding model is the real one.
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+QUERIES = [
+    "What type is Bulbasaur?",
+    "Where can I catch Pikachu in Pokemon Yellow?",
+    "What moves does Charmander learn by level up?",
+    "What is the PP of Hyper Beam?",
+    "What is Eevee weak against?",
+    "How does Onix evolve?",
+]
+
+
+def run_worker(op_threads, search_slots, clients, seconds, corpus_size, out_queue):
+    os.environ["OP_THREADS"] = str(op_threads)
+    os.environ["SEARCH_CONCURRENCY"] = str(search_slots)
+
+    from app import thread_budget
+
+    thread_budget.apply_thread_env(op_threads)
+
+    import faiss
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+
+    thread_budget.apply_runtime_threads(op_threads)
+    model = SentenceTransformer(os.getenv("EMBED_MODEL_NAME", "all-MiniLM-L6-v2"))
+    dim = model.get_sentence_embedding_dimension()
+
+    rng = np.random.default_rng(0)
+    index = faiss.IndexFlatL2(dim)
+    index.add(rng.standard_normal((corpus_size, dim)).astype("float32"))
+
+    executor = thread_budget.make_search_executor()
+
+    def search(query):
+        q_vec = model.encode([query], convert_to_tensor=False).astype("float32")
+        return index.search(q_vec, 8)
+
+    # warm up the model before timing
+    for q in QUERIES:
+        search(q)
+
+    latencies = []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + seconds
+
+    def client(n):
+        i = n
+        while time.monotonic() < stop_at:
+            start = time.monotonic()
+            executor.submit(search, QUERIES[i % len(QUERIES)]).result()
+            with lock:
+                latencies.append(time.monotonic() - start)
+            i += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    out_queue.put(latencies)
+
+
+def run_combination(workers, op_threads, clients, seconds, corpus_size):
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    slots = max(1, (cpus // workers) // op_threads)
+
+    ctx = mp.get_context("spawn")
+    out_queue = ctx.Queue()
+    procs = [
+        ctx.Process(
+            target=run_worker,
+            args=(op_threads, slots, clients, seconds, corpus_size, out_queue),
+        )
+        for _ in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    latencies = []
+    for _ in procs:
+        latencies.extend(out_queue.get())
+    for p in procs:
+        p.join()
+
+    latencies.sort()
+    return {
+        "workers": workers,
+        "op_threads": op_threads,
+        "slots": slots,
+        "qps": len(latencies) / seconds,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(0.99 * (len(latencies) - 1))] * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--op-threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8, help="concurrent callers per worker")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--corpus-size", type=int, default=50000)
+    args = parser.parse_args(argv)
+
+    print(f"{'workers':>7} {'threads':>7} {'slots':>5} {'qps':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for workers in args.workers:
+        for op_threads in args.op_threads:
+            r = run_combination(workers, op_threads, args.clients, args.seconds, args.corpus_size)
+            print(
+                f"{r['workers']:>7} {r['op_threads']:>7} {r['slots']:>5} "
+                f"{r['qps']:>8.1f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
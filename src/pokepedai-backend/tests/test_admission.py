@@ -0,0 +1,51 @@
+import asyncio
+import unittest
+
+from fastapi import HTTPException
+
+from app.admission import AdmissionController
+
+
+async def _request(controller, release):
+    try:
+        async with controller.admit():
+            await release.wait()
+        return "admitted"
+    except HTTPException as exc:
+        return exc.status_code
+
+
+class AdmissionBurstTest(unittest.TestCase):
+    def run_burst(self, staggered):
+        async def burst():
+            controller = AdmissionController(
+                max_concurrent=2, max_queue=2, queue_timeout=5, degrade_queue_depth=0
+            )
+            release = asyncio.Event()
+            tasks = []
+            for _ in range(10):
+                tasks.append(asyncio.create_task(_request(controller, release)))
+                if staggered:
+                    await asyncio.sleep(0)
+            # let every request reach its admission decision before slots free up
+            await asyncio.sleep(0.05)
+            self.assertEqual(controller.in_flight, 2)
+            self.assertEqual(controller.queued, 2)
+            release.set()
+            return await asyncio.gather(*tasks)
+
+        return asyncio.run(burst())
+
+    def test_simultaneous_burst_is_bounded(self):
+        outcomes = self.run_burst(staggered=False)
+        self.assertEqual(outcomes.count("admitted"), 4)
+        self.assertEqual(outcomes.count(503), 6)
+
+    def test_staggered_burst_is_bounded(self):
+        outcomes = self.run_burst(staggered=True)
+        self.assertEqual(outcomes.count("admitted"), 4)
+        self.assertEqual(outcomes.count(503), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -38,6 +38,8 @@ export class ChatClient {
                 method: "POST",
                 headers: {
                     "Content-Type": "application/json",
+                    // lets the backend stop working once we would have given up
+                    "X-Request-Budget-Ms": String(timeoutMs),
                 },
                 body: JSON.stringify({ history, message }),
                 signal: controller.signal,